@@ -0,0 +1,33 @@
+"""Add partial index on enabled Wi-Fi Stalker webhooks
+
+Revision ID: c7d2a9e4f813
+Revises: b5c9e2d7f1a3
+Create Date: 2026-10-15 00:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2a9e4f813'
+down_revision: Union[str, None] = 'b5c9e2d7f1a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_stalker_webhook_config_enabled',
+        'stalker_webhook_config',
+        ['enabled'],
+        unique=False,
+        sqlite_where=sa.text('enabled'),
+        postgresql_where=sa.text('enabled'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stalker_webhook_config_enabled', table_name='stalker_webhook_config')
@@ -0,0 +1,75 @@
+"""Collapse Wi-Fi Stalker webhook event flags into a bitmask
+
+Revision ID: d4e8b1f6a2c9
+Revises: c7d2a9e4f813
+Create Date: 2026-10-15 01:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8b1f6a2c9'
+down_revision: Union[str, None] = 'c7d2a9e4f813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Legacy boolean column -> bit in event_mask
+EVENT_COLUMNS = {
+    'event_device_connected': 1,
+    'event_device_disconnected': 2,
+    'event_device_roamed': 4,
+    'event_device_blocked': 8,
+    'event_device_unblocked': 16,
+}
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('stalker_webhook_config', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('event_mask', sa.Integer(), nullable=False, server_default='31'))
+
+    # Fold existing per-event flags into the mask
+    fold = ' | '.join(
+        f"(CASE WHEN {column} THEN {bit} ELSE 0 END)" for column, bit in EVENT_COLUMNS.items()
+    )
+    op.execute(f"UPDATE stalker_webhook_config SET event_mask = {fold}")
+
+    with op.batch_alter_table('stalker_webhook_config', schema=None) as batch_op:
+        for column in EVENT_COLUMNS:
+            batch_op.drop_column(column)
+
+    # Batch mode recreates the table on SQLite - make sure the partial index survives
+    op.drop_index('ix_stalker_webhook_config_enabled', table_name='stalker_webhook_config', if_exists=True)
+    op.create_index(
+        'ix_stalker_webhook_config_enabled',
+        'stalker_webhook_config',
+        ['enabled'],
+        unique=False,
+        sqlite_where=sa.text('enabled'),
+        postgresql_where=sa.text('enabled'),
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('stalker_webhook_config', schema=None) as batch_op:
+        for column in EVENT_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Boolean(), nullable=False, server_default='1'))
+
+    for column, bit in EVENT_COLUMNS.items():
+        op.execute(f"UPDATE stalker_webhook_config SET {column} = ((event_mask & {bit}) <> 0)")
+
+    with op.batch_alter_table('stalker_webhook_config', schema=None) as batch_op:
+        batch_op.drop_column('event_mask')
+
+    op.drop_index('ix_stalker_webhook_config_enabled', table_name='stalker_webhook_config', if_exists=True)
+    op.create_index(
+        'ix_stalker_webhook_config_enabled',
+        'stalker_webhook_config',
+        ['enabled'],
+        unique=False,
+        sqlite_where=sa.text('enabled'),
+        postgresql_where=sa.text('enabled'),
+    )
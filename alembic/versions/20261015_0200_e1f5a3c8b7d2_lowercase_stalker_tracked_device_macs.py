@@ -0,0 +1,55 @@
+"""Store Wi-Fi Stalker tracked device MACs lowercase
+
+Revision ID: e1f5a3c8b7d2
+Revises: d4e8b1f6a2c9
+Create Date: 2026-10-15 02:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f5a3c8b7d2'
+down_revision: Union[str, None] = 'd4e8b1f6a2c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Tracked devices whose MAC matches an older row apart from case
+_DUPLICATE_DEVICE_IDS = (
+    "SELECT d.id FROM stalker_tracked_devices d WHERE EXISTS ("
+    "SELECT 1 FROM stalker_tracked_devices k "
+    "WHERE lower(k.mac_address) = lower(d.mac_address) AND k.id < d.id)"
+)
+
+
+def upgrade() -> None:
+    # The device form used to check for existing MACs case-sensitively, so a
+    # legacy database can hold one device under two spellings. Refreshes
+    # matched both to the same client, so the oldest row has recorded all
+    # the history the newer ones have; keep it (and a friendly name if it
+    # has none) and drop the duplicates, which lowercasing would otherwise
+    # turn into a UNIQUE violation.
+    op.execute(
+        "UPDATE stalker_tracked_devices SET friendly_name = ("
+        "SELECT d.friendly_name FROM stalker_tracked_devices d "
+        "WHERE lower(d.mac_address) = lower(stalker_tracked_devices.mac_address) "
+        "AND d.friendly_name IS NOT NULL ORDER BY d.id LIMIT 1) "
+        "WHERE friendly_name IS NULL"
+    )
+    for table in ("stalker_connection_history", "stalker_hourly_presence"):
+        op.execute(f"DELETE FROM {table} WHERE device_id IN ({_DUPLICATE_DEVICE_IDS})")
+    op.execute(f"DELETE FROM stalker_tracked_devices WHERE id IN ({_DUPLICATE_DEVICE_IDS})")
+
+    # Reads compare MACs directly now, so normalize any legacy mixed-case rows
+    op.execute(
+        "UPDATE stalker_tracked_devices SET mac_address = lower(mac_address) "
+        "WHERE mac_address != lower(mac_address)"
+    )
+
+
+def downgrade() -> None:
+    # Lowercase MACs are valid for the previous schema; nothing to undo
+    pass
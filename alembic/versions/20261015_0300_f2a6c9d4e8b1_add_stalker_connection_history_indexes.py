@@ -0,0 +1,40 @@
+"""Add composite indexes on Wi-Fi Stalker connection history
+
+Revision ID: f2a6c9d4e8b1
+Revises: e1f5a3c8b7d2
+Create Date: 2026-10-15 03:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6c9d4e8b1'
+down_revision: Union[str, None] = 'e1f5a3c8b7d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_stalker_connection_history_device_connected',
+        'stalker_connection_history',
+        ['device_id', 'connected_at'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_stalker_connection_history_device_wired_connected',
+        'stalker_connection_history',
+        ['device_id', 'is_wired', 'connected_at'],
+        unique=False,
+        sqlite_where=sa.text('ap_name IS NOT NULL'),
+        postgresql_where=sa.text('ap_name IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stalker_connection_history_device_wired_connected', table_name='stalker_connection_history')
+    op.drop_index('ix_stalker_connection_history_device_connected', table_name='stalker_connection_history')
@@ -0,0 +1,49 @@
+"""Add daily AP dwell rollup table for Wi-Fi Stalker analytics
+
+Revision ID: a3c7e9f1b5d4
+Revises: f2a6c9d4e8b1
+Create Date: 2026-10-15 04:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c7e9f1b5d4'
+down_revision: Union[str, None] = 'f2a6c9d4e8b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The scheduler rebuilds the rollup on startup, so the table starts empty
+    op.create_table('stalker_ap_dwell_daily',
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('ap_name', sa.String(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('minutes', sa.Integer(), nullable=False),
+    sa.Column('last_connected_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['device_id'], ['stalker_tracked_devices.id'], ),
+    sa.PrimaryKeyConstraint('device_id', 'ap_name', 'day')
+    )
+    op.create_index(
+        'ix_stalker_ap_dwell_daily_device_day',
+        'stalker_ap_dwell_daily',
+        ['device_id', 'day'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_stalker_connection_history_disconnected',
+        'stalker_connection_history',
+        ['disconnected_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stalker_connection_history_disconnected', table_name='stalker_connection_history')
+    op.drop_index('ix_stalker_ap_dwell_daily_device_day', table_name='stalker_ap_dwell_daily')
+    op.drop_table('stalker_ap_dwell_daily')
@@ -0,0 +1,40 @@
+"""Add per-device disconnect index on Wi-Fi Stalker connection history
+
+Replaces the single-column device_id index, which every composite index
+on the table now covers.
+
+Revision ID: b8d2f4a6c1e3
+Revises: a3c7e9f1b5d4
+Create Date: 2026-10-15 05:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d2f4a6c1e3'
+down_revision: Union[str, None] = 'a3c7e9f1b5d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_stalker_connection_history_device_disconnected',
+        'stalker_connection_history',
+        ['device_id', 'disconnected_at'],
+        unique=False,
+    )
+    op.drop_index('ix_stalker_connection_history_device_id', table_name='stalker_connection_history')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_stalker_connection_history_device_id',
+        'stalker_connection_history',
+        ['device_id'],
+        unique=False,
+    )
+    op.drop_index('ix_stalker_connection_history_device_disconnected', table_name='stalker_connection_history')
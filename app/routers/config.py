@@ -106,10 +106,6 @@ async def save_unifi_config(
                 detail="Username and password are required when api_key is not provided"
             )
 
-        # Invalidate cache and shared session since config is changing
-        cache.invalidate_all()
-        await invalidate_shared_client()
-
         # Encrypt credentials
         encrypted_password = None
         encrypted_api_key = None
@@ -158,6 +154,11 @@ async def save_unifi_config(
         await db.commit()
         logger.info("UniFi configuration saved successfully")
 
+        # Invalidate cache and shared session now that the new config is
+        # committed, so nothing reconnects with the old one in between
+        cache.invalidate_all()
+        await invalidate_shared_client()
+
         return SuccessResponse(
             success=True,
             message="UniFi configuration saved successfully"
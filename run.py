@@ -179,6 +179,30 @@ def _repair_schema():
                 print(f"Schema repair: adding missing column '{col_name}' to {table}")
                 cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_sql}")
 
+    def _fold_webhook_event_columns(cursor):
+        """Fold legacy per-event webhook booleans into event_mask and drop them."""
+        legacy_bits = {
+            'event_device_connected': 1,
+            'event_device_disconnected': 2,
+            'event_device_roamed': 4,
+            'event_device_blocked': 8,
+            'event_device_unblocked': 16,
+        }
+        cursor.execute("PRAGMA table_info(stalker_webhook_config)")
+        existing = {row[1] for row in cursor.fetchall()}
+        legacy = {col: bit for col, bit in legacy_bits.items() if col in existing}
+        if not legacy:
+            return
+        print("Schema repair: folding webhook event columns into event_mask")
+        # Events without a legacy column stay enabled (matches the old defaults)
+        fold = " | ".join(
+            [f"(CASE WHEN {col} THEN {bit} ELSE 0 END)" for col, bit in legacy.items()]
+            + [str(bit) for col, bit in legacy_bits.items() if col not in legacy]
+        )
+        cursor.execute(f"UPDATE stalker_webhook_config SET event_mask = {fold}")
+        for col in legacy:
+            cursor.execute(f"ALTER TABLE stalker_webhook_config DROP COLUMN {col}")
+
     try:
         conn = sqlite3.connect(str(db_path))
         cursor = conn.cursor()
@@ -209,11 +233,11 @@ def _repair_schema():
             'ssid': "ssid VARCHAR",
         })
 
-        # stalker_webhook_config — migration #3
+        # stalker_webhook_config — migration #12 (event flags folded into event_mask)
         _add_missing_columns(cursor, 'stalker_webhook_config', {
-            'event_device_blocked': "event_device_blocked BOOLEAN",
-            'event_device_unblocked': "event_device_unblocked BOOLEAN",
+            'event_mask': "event_mask INTEGER NOT NULL DEFAULT 31",
         })
+        _fold_webhook_event_columns(cursor)
 
         # unifi_config — migrations #4, #6
         _add_missing_columns(cursor, 'unifi_config', {
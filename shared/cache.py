@@ -6,7 +6,7 @@ change frequently. Data is cached with a TTL and refreshed on demand.
 """
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +16,16 @@ CACHE_TTL_SECONDS = 30
 # Update check TTL — 1 hour to avoid GitHub API rate limits
 UPDATE_CHECK_TTL_SECONDS = 3600
 
+# Connected client list TTL — short, since clients come and go constantly
+UNIFI_CLIENTS_TTL_SECONDS = 10
+
+# Per-client blocked status TTL
+CLIENT_BLOCKED_TTL_SECONDS = 30
+
+# AP/switch name maps TTL — device names rarely change, so reuse them across
+# several refresh cycles
+DEVICE_NAMES_TTL_SECONDS = 300
+
 # Global cache storage
 _cache: Dict[str, Dict[str, Any]] = {}
 
@@ -139,6 +149,168 @@ def set_update_check(data: Dict):
     logger.debug(f"Cached update check: update_available={data.get('update_available')}")
 
 
+def get_unifi_clients(site: str) -> Optional[Dict]:
+    """
+    Get the cached connected client list for a site (short TTL).
+
+    Returns:
+        Clients dict keyed by MAC if cached and not expired, None otherwise
+    """
+    entry = _cache.get(f"unifi_clients:{site}")
+    if entry and not _is_expired_custom(entry, UNIFI_CLIENTS_TTL_SECONDS):
+        logger.debug(f"Returning cached UniFi clients for site {site}")
+        return entry.get("data")
+    return None
+
+
+def set_unifi_clients(site: str, data: Dict):
+    """
+    Cache the connected client list for a site.
+
+    Args:
+        site: UniFi site ID
+        data: Clients dict from UniFiClient.get_clients()
+    """
+    _cache[f"unifi_clients:{site}"] = {
+        "data": data,
+        "timestamp": datetime.now(timezone.utc)
+    }
+    logger.debug(f"Cached {len(data)} UniFi clients for site {site}")
+
+
+def invalidate_unifi_clients(site: str):
+    """Invalidate the cached client list for a site."""
+    invalidate(f"unifi_clients:{site}")
+
+
+def get_client_blocked(mac: str) -> Optional[bool]:
+    """
+    Get the cached blocked status for a client.
+
+    Returns:
+        True/False if cached and not expired, None otherwise
+    """
+    entry = _cache.get(f"client_blocked:{mac}")
+    if entry and not _is_expired_custom(entry, CLIENT_BLOCKED_TTL_SECONDS):
+        logger.debug(f"Returning cached blocked status for {mac}")
+        return entry.get("data")
+    return None
+
+
+def set_client_blocked(mac: str, blocked: bool):
+    """
+    Cache the blocked status for a client.
+
+    Args:
+        mac: Normalized (lowercase) client MAC address
+        blocked: Whether the client is blocked in UniFi
+    """
+    _cache[f"client_blocked:{mac}"] = {
+        "data": blocked,
+        "timestamp": datetime.now(timezone.utc)
+    }
+
+
+def get_blocked_clients(site: str) -> Optional[Set[str]]:
+    """
+    Get the cached set of blocked client MACs for a site.
+
+    Returns:
+        Set of lowercase MACs if cached and not expired, None otherwise
+    """
+    entry = _cache.get(f"blocked_clients:{site}")
+    if entry and not _is_expired_custom(entry, CLIENT_BLOCKED_TTL_SECONDS):
+        logger.debug(f"Returning cached blocked clients for site {site}")
+        return entry.get("data")
+    return None
+
+
+def set_blocked_clients(site: str, macs: Set[str]):
+    """
+    Cache the set of blocked client MACs for a site.
+
+    Args:
+        site: UniFi site ID
+        macs: Lowercase MACs from UniFiClient.get_blocked_clients()
+    """
+    _cache[f"blocked_clients:{site}"] = {
+        "data": macs,
+        "timestamp": datetime.now(timezone.utc)
+    }
+
+
+def invalidate_blocked_clients(site: str):
+    """Invalidate the cached blocked client set for a site."""
+    invalidate(f"blocked_clients:{site}")
+
+
+def get_device_names(site: str) -> Optional[Tuple[Dict[str, str], Dict[str, str]]]:
+    """
+    Get the cached AP and switch name maps for a site.
+
+    Returns:
+        (ap_names, switch_names) if cached and not expired, None otherwise
+    """
+    entry = _cache.get(f"device_names:{site}")
+    if entry and not _is_expired_custom(entry, DEVICE_NAMES_TTL_SECONDS):
+        logger.debug(f"Returning cached device names for site {site}")
+        return entry.get("data")
+    return None
+
+
+def set_device_names(site: str, ap_names: Dict[str, str], switch_names: Dict[str, str]):
+    """
+    Cache the AP and switch name maps for a site.
+
+    Args:
+        site: UniFi site ID
+        ap_names: AP names by MAC/BSSID from UniFiClient.get_device_name_maps()
+        switch_names: Switch names by MAC from UniFiClient.get_device_name_maps()
+    """
+    _cache[f"device_names:{site}"] = {
+        "data": (ap_names, switch_names),
+        "timestamp": datetime.now(timezone.utc)
+    }
+    logger.debug(f"Cached {len(switch_names)} device names for site {site}")
+
+
+def invalidate_device_names(site: str):
+    """Invalidate the cached AP and switch name maps for a site."""
+    invalidate(f"device_names:{site}")
+
+
+def get_tracked_macs() -> Optional[Set[str]]:
+    """
+    Get the cached set of MACs tracked by Wi-Fi Stalker.
+
+    Returns:
+        Set of lowercase MACs if cached and not expired, None otherwise
+    """
+    entry = _cache.get("tracked_macs")
+    if entry and not _is_expired(entry):
+        logger.debug("Returning cached tracked MACs")
+        return entry.get("data")
+    return None
+
+
+def set_tracked_macs(macs: Set[str]):
+    """
+    Cache the set of MACs tracked by Wi-Fi Stalker.
+
+    Args:
+        macs: Set of lowercase MAC addresses
+    """
+    _cache["tracked_macs"] = {
+        "data": macs,
+        "timestamp": datetime.now(timezone.utc)
+    }
+
+
+def invalidate_tracked_macs():
+    """Invalidate the cached set of tracked MACs."""
+    invalidate("tracked_macs")
+
+
 def invalidate_all():
     """
     Invalidate all cached data.
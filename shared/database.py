@@ -1,9 +1,11 @@
 """
 Database connection and session management for UI Toolkit
 """
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from typing import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Sequence
 from pathlib import Path
 from shared.config import get_settings
 from shared.models.base import Base
@@ -41,10 +43,20 @@ class Database:
                 raise
             logger.info(f"Ensured data directory exists: {db_dir}")
 
+        # File-backed databases get a connection queue pool. Hand out the most
+        # recently returned connection first, so the scheduler jobs and API
+        # requests keep reusing the same warm connection (and its SQLite page
+        # cache) while the rest of the pool sits idle. In-memory databases use
+        # a single static connection, which takes no pool options.
+        engine_options = {}
+        if make_url(settings.database_url).database not in (None, "", ":memory:"):
+            engine_options["pool_use_lifo"] = True
+
         # Create async engine
         self.engine = create_async_engine(
             settings.database_url,
-            echo=settings.log_level.upper() == "DEBUG"
+            echo=settings.log_level.upper() == "DEBUG",
+            **engine_options
         )
 
         # Create session factory
@@ -64,9 +76,17 @@ class Database:
 
         logger.info("Database initialized successfully")
 
-    async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
         """
-        Get an async database session
+        Open an async database session for background tasks
+
+        The session is closed on exit, rolling back anything not committed
+        and returning its connection to the pool, even if the block raises.
+
+        Usage:
+            async with get_database().session() as session:
+                ...
 
         Yields:
             AsyncSession: Database session
@@ -77,6 +97,16 @@ class Database:
         async with self.async_session_factory() as session:
             yield session
 
+    async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Get an async database session
+
+        Yields:
+            AsyncSession: Database session
+        """
+        async with self.session() as session:
+            yield session
+
     async def close(self):
         """
         Close database engine and cleanup resources
@@ -118,3 +148,28 @@ async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
     db = get_database()
     async for session in db.get_session():
         yield session
+
+
+async def page_total(session: AsyncSession, rows: Sequence, offset: int, count_query) -> int:
+    """
+    Get the total row count for a page fetched with a total_count window column
+    (func.count().over().label("total_count")).
+
+    Only falls back to running count_query when the page is past the end
+    and has no rows to carry the count.
+
+    Args:
+        session: Database session the page was fetched with
+        rows: Rows of the page
+        offset: Offset the page was fetched at
+        count_query: Query selecting the total row count
+
+    Returns:
+        Total number of rows across all pages
+    """
+    if rows:
+        return rows[0].total_count
+    if not offset:
+        return 0
+    total_result = await session.execute(count_query)
+    return total_result.scalar()
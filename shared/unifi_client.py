@@ -1,9 +1,10 @@
 """
 UniFi API client wrapper using aiounifi
 """
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set, Tuple
 import aiohttp
 from aiounifi.controller import Controller
+from aiounifi.errors import Forbidden, LoginRequired, Unauthorized
 from aiounifi.models.configuration import Configuration
 from aiounifi.interfaces.clients import ClientListRequest
 from aiounifi.interfaces.devices import DeviceListRequest
@@ -212,6 +213,9 @@ class UniFiClient:
         self.is_unifi_os = api_key is not None
         self._detected_type: Optional[str] = None  # Track what we detected
         self._v2_uses_new_payload: Optional[bool] = None  # None=unknown, True/False=cached
+        # Set once the controller rejects this session (expired login or revoked
+        # credentials); a new client has to connect before requests work again
+        self.session_expired = False
 
     async def connect(self) -> bool:
         """
@@ -417,6 +421,11 @@ class UniFiClient:
         self._session = None
         self.controller = None
 
+    def _note_response_status(self, status: int):
+        """Flag the session as expired if the controller rejected a request"""
+        if status in (401, 403):
+            self.session_expired = True
+
     async def get_clients(self) -> Dict:
         """
         Get all active clients from the UniFi controller
@@ -434,6 +443,7 @@ class UniFiClient:
                 async with self._session.get(url) as resp:
                     if resp.status != 200:
                         logger.error(f"Failed to get clients: {resp.status}")
+                        self._note_response_status(resp.status)
                         raise RuntimeError(f"API request failed: {resp.status}")
 
                     data = await resp.json()
@@ -537,6 +547,8 @@ class UniFiClient:
 
         except Exception as e:
             logger.error(f"Failed to get clients from UniFi controller: {e}")
+            if isinstance(e, (LoginRequired, Unauthorized, Forbidden)):
+                self.session_expired = True
             raise
 
     async def get_client_by_mac(self, mac_address: str):
@@ -725,6 +737,96 @@ class UniFiClient:
             logger.error(f"Failed to get switch name for {sw_mac}: {e}")
             return sw_mac
 
+    async def get_device_name_maps(self) -> Optional[Tuple[Dict[str, str], Dict[str, str]]]:
+        """
+        Get AP and switch names for every device in one request.
+
+        Resolves names the same way as get_ap_name_by_mac() and
+        get_switch_name_by_mac(), so a refresh cycle can look names up for
+        all tracked clients without a request per client.
+
+        Returns:
+            Tuple of (ap_names, switch_names) dicts keyed by lowercase MAC.
+            ap_names also includes radio BSSIDs of devices with built-in Wi-Fi.
+            None if the device list can't be fetched.
+        """
+        try:
+            if self.is_unifi_os:
+                url = f"{self.host}/proxy/network/api/s/{self.site}/stat/device"
+            else:
+                url = f"{self.host}/api/s/{self.site}/stat/device"
+
+            async with self._session.get(url) as resp:
+                if resp.status != 200:
+                    logger.error(f"Failed to get devices: {resp.status}")
+                    self._note_response_status(resp.status)
+                    return None
+
+                data = await resp.json()
+                devices = data.get('data', [])
+
+            switch_names = {}
+            for device in devices:
+                device_mac = device.get('mac', '').lower()
+                if device_mac:
+                    name = device.get('name') or get_friendly_model_name(device.get('model', ''))
+                    switch_names.setdefault(device_mac, name or device_mac)
+
+            # Standalone APs match on their device MAC first
+            ap_names = {}
+            for device in devices:
+                device_mac = device.get('mac', '').lower()
+                if device.get('type') == 'uap' and device_mac:
+                    ap_names.setdefault(device_mac, switch_names[device_mac])
+
+            # Then any device MAC or radio BSSID, first device wins
+            for device in devices:
+                device_mac = device.get('mac', '').lower()
+                friendly_name = switch_names.get(device_mac, device_mac)
+                if device_mac:
+                    ap_names.setdefault(device_mac, friendly_name)
+                for vap in device.get('vap_table', []):
+                    for vap_mac in (vap.get('bssid', '').lower(), vap.get('ap_mac', '').lower()):
+                        if vap_mac:
+                            ap_names.setdefault(vap_mac, friendly_name)
+
+            return ap_names, switch_names
+        except Exception as e:
+            logger.error(f"Failed to get device names: {e}")
+            return None
+
+    async def get_blocked_clients(self) -> Optional[Set[str]]:
+        """
+        Get the MAC addresses of all blocked clients in one request
+
+        Returns:
+            Set of lowercase MACs, or None if the client list can't be fetched
+        """
+        if not self._session:
+            raise RuntimeError("Not connected to UniFi controller. Call connect() first.")
+
+        try:
+            if self.is_unifi_os:
+                url = f"{self.host}/proxy/network/api/s/{self.site}/rest/user"
+            else:
+                url = f"{self.host}/api/s/{self.site}/rest/user"
+
+            async with self._session.get(url) as resp:
+                if resp.status != 200:
+                    logger.error(f"Failed to get blocked clients: {resp.status}")
+                    self._note_response_status(resp.status)
+                    return None
+
+                data = await resp.json()
+                return {
+                    user.get('mac', '').lower()
+                    for user in data.get('data', [])
+                    if user.get('blocked', False)
+                }
+        except Exception as e:
+            logger.error(f"Error getting blocked clients: {e}")
+            return None
+
     async def block_client(self, mac_address: str) -> bool:
         """
         Block a client device
@@ -755,6 +857,7 @@ class UniFiClient:
                     return True
                 else:
                     logger.error(f"Failed to block client {mac_address}: {resp.status}")
+                    self._note_response_status(resp.status)
                     return False
 
         except Exception as e:
@@ -791,6 +894,7 @@ class UniFiClient:
                     return True
                 else:
                     logger.error(f"Failed to unblock client {mac_address}: {resp.status}")
+                    self._note_response_status(resp.status)
                     return False
 
         except Exception as e:
@@ -824,6 +928,8 @@ class UniFiClient:
 
                     if user:
                         return user.get('blocked', False)
+                else:
+                    self._note_response_status(resp.status)
 
             return False
 
@@ -868,6 +974,7 @@ class UniFiClient:
                             if update_resp.status == 200:
                                 logger.info(f"Successfully set name for {mac_address} to '{name}'")
                                 return True
+                            self._note_response_status(update_resp.status)
                     else:
                         # User doesn't exist yet, create it
                         payload = {
@@ -878,6 +985,9 @@ class UniFiClient:
                             if create_resp.status == 200:
                                 logger.info(f"Successfully created user and set name for {mac_address} to '{name}'")
                                 return True
+                            self._note_response_status(create_resp.status)
+                else:
+                    self._note_response_status(resp.status)
 
             logger.error(f"Failed to set name for {mac_address}")
             return False
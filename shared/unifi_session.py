@@ -14,6 +14,7 @@ from typing import Optional
 
 from sqlalchemy import select
 
+from shared import cache
 from shared.database import get_database
 from shared.models.unifi_config import UniFiConfig
 from shared.unifi_client import UniFiClient
@@ -101,17 +102,27 @@ async def get_shared_client() -> Optional[UniFiClient]:
     return _shared_client
 
 
-async def invalidate_shared_client():
+async def invalidate_shared_client(client: Optional[UniFiClient] = None):
     """
     Disconnect and clear the shared client.
 
     Called when UniFi config is saved via the web UI so the next scheduler
-    run creates a fresh client with the updated credentials.
+    run creates a fresh client with the updated credentials, and when the
+    controller rejects the shared session.
+
+    Args:
+        client: Only invalidate if this is still the shared client, so a
+                caller holding an expired session doesn't drop one that
+                has already been replaced
     """
     global _shared_client
 
+    if client is not None and client is not _shared_client:
+        return
+
     if _shared_client is not None:
-        logger.info("Invalidating shared UniFi session (config changed)")
+        logger.info("Invalidating shared UniFi session")
+        cache.invalidate_device_names(_shared_client.site)
         try:
             await _shared_client.disconnect()
         except Exception as e:
@@ -56,6 +56,21 @@ class WebSocketManager:
         for connection in disconnected:
             self.disconnect(connection)
 
+    async def broadcast_device_updates(self, devices: List[dict]):
+        """
+        Broadcast several device updates to all connected clients in one message
+
+        Args:
+            devices: List of dictionaries containing device information
+        """
+        if not devices:
+            return
+
+        await self.broadcast({
+            "type": "device_updates",
+            "devices": devices
+        })
+
     async def broadcast(self, data: dict):
         """
         Broadcast arbitrary data to all connected clients
@@ -125,6 +125,165 @@ class TestSystemStatusCache:
         assert result == data
 
 
+class TestUniFiClientsCache:
+    """Tests for connected client list caching."""
+
+    def setup_method(self):
+        """Clear cache before each test."""
+        cache.invalidate_all()
+
+    def test_get_unifi_clients_returns_none_when_empty(self):
+        """Should return None when nothing is cached for the site."""
+        assert cache.get_unifi_clients("default") is None
+
+    def test_clients_cached_per_site(self):
+        """Should keep client lists for different sites separate."""
+        cache.set_unifi_clients("default", {"aa:bb:cc:dd:ee:ff": {"hostname": "a"}})
+
+        assert cache.get_unifi_clients("default") == {"aa:bb:cc:dd:ee:ff": {"hostname": "a"}}
+        assert cache.get_unifi_clients("other") is None
+
+    def test_clients_expire_after_short_ttl(self):
+        """Client list should expire after its own TTL."""
+        cache.set_unifi_clients("default", {})
+        cache._cache["unifi_clients:default"]["timestamp"] = (
+            datetime.now(timezone.utc) - timedelta(seconds=cache.UNIFI_CLIENTS_TTL_SECONDS + 1)
+        )
+
+        assert cache.get_unifi_clients("default") is None
+
+    def test_invalidate_unifi_clients(self):
+        """Should drop the cached client list for a site."""
+        cache.set_unifi_clients("default", {})
+        cache.invalidate_unifi_clients("default")
+
+        assert cache.get_unifi_clients("default") is None
+
+
+class TestClientBlockedCache:
+    """Tests for per-client blocked status caching."""
+
+    def setup_method(self):
+        """Clear cache before each test."""
+        cache.invalidate_all()
+
+    def test_get_client_blocked_returns_none_when_empty(self):
+        """Should return None (not False) when status is unknown."""
+        assert cache.get_client_blocked("aa:bb:cc:dd:ee:ff") is None
+
+    def test_cached_false_is_returned(self):
+        """Should distinguish a cached False from a cache miss."""
+        cache.set_client_blocked("aa:bb:cc:dd:ee:ff", False)
+
+        assert cache.get_client_blocked("aa:bb:cc:dd:ee:ff") is False
+
+    def test_blocked_status_expires_after_ttl(self):
+        """Blocked status should expire after its TTL."""
+        cache.set_client_blocked("aa:bb:cc:dd:ee:ff", True)
+        cache._cache["client_blocked:aa:bb:cc:dd:ee:ff"]["timestamp"] = (
+            datetime.now(timezone.utc) - timedelta(seconds=cache.CLIENT_BLOCKED_TTL_SECONDS + 1)
+        )
+
+        assert cache.get_client_blocked("aa:bb:cc:dd:ee:ff") is None
+
+
+class TestBlockedClientsCache:
+    """Tests for per-site blocked client set caching."""
+
+    def setup_method(self):
+        """Clear cache before each test."""
+        cache.invalidate_all()
+
+    def test_get_blocked_clients_returns_none_when_empty(self):
+        """Should return None (not an empty set) when nothing is cached."""
+        assert cache.get_blocked_clients("default") is None
+
+    def test_cached_empty_set_is_returned(self):
+        """Should distinguish a cached empty set from a cache miss."""
+        cache.set_blocked_clients("default", set())
+
+        assert cache.get_blocked_clients("default") == set()
+        assert cache.get_blocked_clients("other") is None
+
+    def test_blocked_clients_expire_after_ttl(self):
+        """Blocked client set should expire with the per-client blocked TTL."""
+        cache.set_blocked_clients("default", {"aa:bb:cc:dd:ee:ff"})
+        cache._cache["blocked_clients:default"]["timestamp"] = (
+            datetime.now(timezone.utc) - timedelta(seconds=cache.CLIENT_BLOCKED_TTL_SECONDS + 1)
+        )
+
+        assert cache.get_blocked_clients("default") is None
+
+    def test_invalidate_blocked_clients(self):
+        """Should drop the cached blocked client set for a site."""
+        cache.set_blocked_clients("default", {"aa:bb:cc:dd:ee:ff"})
+        cache.invalidate_blocked_clients("default")
+
+        assert cache.get_blocked_clients("default") is None
+
+
+class TestDeviceNamesCache:
+    """Tests for AP/switch name map caching."""
+
+    def setup_method(self):
+        """Clear cache before each test."""
+        cache.invalidate_all()
+
+    def test_get_device_names_returns_none_when_empty(self):
+        """Should return None when nothing is cached for the site."""
+        assert cache.get_device_names("default") is None
+
+    def test_device_names_cached_per_site(self):
+        """Should return both maps for the site they were cached for."""
+        ap_names = {"aa:bb:cc:00:00:01": "Office AP"}
+        switch_names = {"aa:bb:cc:00:00:02": "Core Switch"}
+        cache.set_device_names("default", ap_names, switch_names)
+
+        assert cache.get_device_names("default") == (ap_names, switch_names)
+        assert cache.get_device_names("other") is None
+
+    def test_device_names_expire_after_ttl(self):
+        """Name maps should expire after their TTL."""
+        cache.set_device_names("default", {}, {})
+        cache._cache["device_names:default"]["timestamp"] = (
+            datetime.now(timezone.utc) - timedelta(seconds=cache.DEVICE_NAMES_TTL_SECONDS + 1)
+        )
+
+        assert cache.get_device_names("default") is None
+
+    def test_invalidate_device_names(self):
+        """Should drop the cached name maps for a site."""
+        cache.set_device_names("default", {}, {})
+        cache.invalidate_device_names("default")
+
+        assert cache.get_device_names("default") is None
+
+
+class TestTrackedMacsCache:
+    """Tests for Wi-Fi Stalker tracked MAC set caching."""
+
+    def setup_method(self):
+        """Clear cache before each test."""
+        cache.invalidate_all()
+
+    def test_get_tracked_macs_returns_none_when_empty(self):
+        """Should return None when no set is cached."""
+        assert cache.get_tracked_macs() is None
+
+    def test_cached_empty_set_is_returned(self):
+        """An empty set means nothing is tracked, not a cache miss."""
+        cache.set_tracked_macs(set())
+
+        assert cache.get_tracked_macs() == set()
+
+    def test_invalidate_tracked_macs(self):
+        """Should drop the cached set."""
+        cache.set_tracked_macs({"aa:bb:cc:00:00:01"})
+        cache.invalidate_tracked_macs()
+
+        assert cache.get_tracked_macs() is None
+
+
 class TestCacheInvalidation:
     """Tests for cache invalidation."""
 
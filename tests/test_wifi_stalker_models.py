@@ -0,0 +1,105 @@
+"""Tests for Wi-Fi Stalker API models."""
+from datetime import datetime, timezone
+
+import pytest
+
+from tools.wifi_stalker.database import (
+    EVT_ALL,
+    EVT_BLOCKED,
+    EVT_CONNECTED,
+    EVT_ROAMED,
+    TrackedDevice,
+    WebhookConfig,
+)
+from tools.wifi_stalker.models import WebhookResponse, normalize_mac_address
+
+
+class TestNormalizeMacAddress:
+    """Tests for MAC address normalization."""
+
+    def test_canonical_mac_returned_unchanged(self):
+        """Should return an already-normalized MAC as-is."""
+        assert normalize_mac_address("aa:bb:cc:dd:ee:ff") == "aa:bb:cc:dd:ee:ff"
+
+    @pytest.mark.parametrize("mac", [
+        "AA:BB:CC:DD:EE:FF",
+        "aa-bb-cc-dd-ee-ff",
+        "aabb.ccdd.eeff",
+        "AABBCCDDEEFF",
+    ])
+    def test_common_formats_normalized(self, mac):
+        """Should normalize common MAC formats to lowercase colon-separated."""
+        assert normalize_mac_address(mac) == "aa:bb:cc:dd:ee:ff"
+
+    @pytest.mark.parametrize("mac", ["", "aa:bb:cc:dd:ee", "aa:bb:cc:dd:ee:ff:00"])
+    def test_invalid_length_raises(self, mac):
+        """Should reject MACs that don't have exactly 12 hex digits."""
+        with pytest.raises(ValueError):
+            normalize_mac_address(mac)
+
+    def test_canonical_with_trailing_newline_is_normalized(self):
+        """Should not let a trailing newline slip through the fast path."""
+        assert normalize_mac_address("aa:bb:cc:dd:ee:ff\n") == "aa:bb:cc:dd:ee:ff"
+
+
+class TestTrackedDevice:
+    """Tests for the TrackedDevice ORM model."""
+
+    def test_mac_address_stored_lowercase(self):
+        """Should lowercase MACs on assignment so reads can compare directly."""
+        device = TrackedDevice(mac_address="AA:BB:CC:DD:EE:FF", site_id="default")
+
+        assert device.mac_address == "aa:bb:cc:dd:ee:ff"
+
+
+class TestWebhookResponse:
+    """Tests for the event_mask-backed webhook response model."""
+
+    def _make_webhook(self, event_mask: int) -> WebhookConfig:
+        return WebhookConfig(
+            id=1,
+            name="Test",
+            webhook_type="slack",
+            url="https://hooks.example.com/test",
+            event_mask=event_mask,
+            enabled=True,
+            created_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+
+    def test_all_events_enabled(self):
+        """Should report every event flag when all bits are set."""
+        response = WebhookResponse.model_validate(self._make_webhook(EVT_ALL))
+
+        assert response.event_device_connected
+        assert response.event_device_disconnected
+        assert response.event_device_roamed
+        assert response.event_device_blocked
+        assert response.event_device_unblocked
+
+    def test_partial_mask(self):
+        """Should only report the events whose bits are set."""
+        mask = EVT_CONNECTED | EVT_ROAMED | EVT_BLOCKED
+        response = WebhookResponse.model_validate(self._make_webhook(mask))
+
+        assert response.event_device_connected
+        assert not response.event_device_disconnected
+        assert response.event_device_roamed
+        assert response.event_device_blocked
+        assert not response.event_device_unblocked
+
+    def test_serialized_output_includes_event_flags(self):
+        """Should keep the per-event booleans in the JSON payload."""
+        response = WebhookResponse.model_validate(self._make_webhook(EVT_CONNECTED))
+        data = response.model_dump()
+
+        assert data["event_mask"] == EVT_CONNECTED
+        assert data["event_device_connected"] is True
+        assert data["event_device_unblocked"] is False
+
+    @pytest.mark.parametrize("mask", [0, EVT_ALL])
+    def test_round_trip_through_dump(self, mask):
+        """Should validate its own dumped output (FastAPI response re-validation)."""
+        response = WebhookResponse.model_validate(self._make_webhook(mask))
+        again = WebhookResponse.model_validate(response.model_dump())
+
+        assert again.event_mask == mask
@@ -8,7 +8,7 @@ from sqlalchemy import select, func, asc, desc, and_, or_
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
-from shared.database import get_db_session
+from shared.database import get_db_session, page_total
 from tools.threat_watch.database import ThreatEvent, ThreatIgnoreRule
 
 logger = logging.getLogger(__name__)
@@ -63,8 +63,8 @@ async def get_events(
     """
     Get paginated list of threat events with optional filtering
     """
-    # Build query
-    query = select(ThreatEvent)
+    # Build query (the total count rides along on each row via a window function)
+    query = select(ThreatEvent, func.count().over().label("total_count"))
     count_query = select(func.count(ThreatEvent.id))
 
     # Apply filters
@@ -103,10 +103,6 @@ async def get_events(
         query = query.where(and_(*filters))
         count_query = count_query.where(and_(*filters))
 
-    # Get total count
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-
     # Apply sorting
     sortable_columns = {
         'timestamp': ThreatEvent.timestamp,
@@ -126,7 +122,9 @@ async def get_events(
 
     # Execute query
     result = await db.execute(query)
-    events = result.scalars().all()
+    rows = result.all()
+    events = [row.ThreatEvent for row in rows]
+    total = await page_total(db, rows, offset, count_query)
 
     has_more = (offset + len(events)) < total
 
@@ -438,7 +436,7 @@ async def get_events_by_ip(
     Get all events for a specific IP address (source or destination)
     """
     # Build query for events where IP is source or destination
-    query = select(ThreatEvent).where(
+    query = select(ThreatEvent, func.count().over().label("total_count")).where(
         or_(
             ThreatEvent.src_ip == ip_address,
             ThreatEvent.dest_ip == ip_address
@@ -451,17 +449,15 @@ async def get_events_by_ip(
         )
     )
 
-    # Get total count
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-
     # Apply pagination and ordering
     offset = (page - 1) * page_size
     query = query.order_by(desc(ThreatEvent.timestamp)).offset(offset).limit(page_size)
 
     # Execute query
     result = await db.execute(query)
-    events = result.scalars().all()
+    rows = result.all()
+    events = [row.ThreatEvent for row in rows]
+    total = await page_total(db, rows, offset, count_query)
 
     has_more = (offset + len(events)) < total
 
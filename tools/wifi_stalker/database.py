@@ -1,11 +1,38 @@
 """
 Database models for Wi-Fi Stalker
 """
-from datetime import datetime, timezone
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, LargeBinary, UniqueConstraint
-from sqlalchemy.orm import relationship
+from datetime import date, datetime, timezone
+from typing import List, Optional
+from sqlalchemy import Boolean, Date, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint, text
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 from shared.models.base import Base
 
+# Webhook event trigger bits (stored together in WebhookConfig.event_mask)
+EVT_CONNECTED = 1
+EVT_DISCONNECTED = 2
+EVT_ROAMED = 4
+EVT_BLOCKED = 8
+EVT_UNBLOCKED = 16
+EVT_ALL = EVT_CONNECTED | EVT_DISCONNECTED | EVT_ROAMED | EVT_BLOCKED | EVT_UNBLOCKED
+
+# Webhook event type -> trigger bit
+WEBHOOK_EVENT_BITS = {
+    'connected': EVT_CONNECTED,
+    'disconnected': EVT_DISCONNECTED,
+    'roamed': EVT_ROAMED,
+    'blocked': EVT_BLOCKED,
+    'unblocked': EVT_UNBLOCKED,
+}
+
+# API boolean field -> trigger bit
+WEBHOOK_EVENT_FIELDS = {
+    'event_device_connected': EVT_CONNECTED,
+    'event_device_disconnected': EVT_DISCONNECTED,
+    'event_device_roamed': EVT_ROAMED,
+    'event_device_blocked': EVT_BLOCKED,
+    'event_device_unblocked': EVT_UNBLOCKED,
+}
+
 
 class TrackedDevice(Base):
     """
@@ -13,30 +40,53 @@ class TrackedDevice(Base):
     """
     __tablename__ = "stalker_tracked_devices"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    mac_address = Column(String, unique=True, nullable=False, index=True)
-    friendly_name = Column(String, nullable=True)
-    added_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    last_seen = Column(DateTime, nullable=True)
-    current_ap_mac = Column(String, nullable=True)
-    current_ap_name = Column(String, nullable=True)
-    current_ssid = Column(String, nullable=True)
-    current_ip_address = Column(String, nullable=True)
-    current_signal_strength = Column(Integer, nullable=True)
-    current_radio = Column(String, nullable=True)  # "ng" (2.4GHz), "na" (5GHz), "6e" (6GHz)
-    is_connected = Column(Boolean, default=False, nullable=False)
-    is_blocked = Column(Boolean, default=False, nullable=False)
-    site_id = Column(String, nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    mac_address: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    friendly_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    added_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    last_seen: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    current_ap_mac: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    current_ap_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    current_ssid: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    current_ip_address: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    current_signal_strength: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # "ng" (2.4GHz), "na" (5GHz), "6e" (6GHz)
+    current_radio: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    is_connected: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    is_blocked: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    site_id: Mapped[str] = mapped_column(String, nullable=False)
     # Wired device support
-    is_wired = Column(Boolean, default=False, nullable=False)
-    current_switch_mac = Column(String, nullable=True)
-    current_switch_name = Column(String, nullable=True)
-    current_switch_port = Column(Integer, nullable=True)
+    is_wired: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    current_switch_mac: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    current_switch_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    current_switch_port: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     # Relationship to connection history
-    history = relationship("ConnectionHistory", back_populates="device", cascade="all, delete-orphan")
+    history: Mapped[List["ConnectionHistory"]] = relationship(
+        back_populates="device", cascade="all, delete-orphan"
+    )
+    # Connection history entries still open, newest first (normally at most one)
+    open_history: Mapped[List["ConnectionHistory"]] = relationship(
+        primaryjoin="and_(TrackedDevice.id == ConnectionHistory.device_id, "
+                    "ConnectionHistory.disconnected_at.is_(None))",
+        order_by="ConnectionHistory.connected_at.desc()",
+        viewonly=True,
+    )
     # Relationship to hourly presence data
-    hourly_presence = relationship("HourlyPresence", back_populates="device", cascade="all, delete-orphan")
+    hourly_presence: Mapped[List["HourlyPresence"]] = relationship(
+        back_populates="device", cascade="all, delete-orphan"
+    )
+    # Relationship to daily per-AP dwell rollups
+    ap_dwell_daily: Mapped[List["ApDwellDaily"]] = relationship(
+        back_populates="device", cascade="all, delete-orphan"
+    )
+
+    @validates("mac_address")
+    def _normalize_mac_address(self, key, value):
+        # Stored lowercase so read paths can compare MACs without re-normalizing
+        return value.lower() if value else value
 
     def __repr__(self):
         return f"<TrackedDevice(mac={self.mac_address}, name={self.friendly_name}, connected={self.is_connected})>"
@@ -48,23 +98,45 @@ class ConnectionHistory(Base):
     """
     __tablename__ = "stalker_connection_history"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    device_id = Column(Integer, ForeignKey("stalker_tracked_devices.id"), nullable=False, index=True)
-    ap_mac = Column(String, nullable=True)
-    ap_name = Column(String, nullable=True)
-    ssid = Column(String, nullable=True)
-    connected_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
-    disconnected_at = Column(DateTime, nullable=True)
-    duration_seconds = Column(Integer, nullable=True)
-    signal_strength = Column(Integer, nullable=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # Indexed by the composite indexes below, which all lead with device_id
+    device_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("stalker_tracked_devices.id"), nullable=False
+    )
+    ap_mac: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    ap_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    ssid: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    connected_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+    disconnected_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    duration_seconds: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    signal_strength: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     # Wired device support
-    is_wired = Column(Boolean, default=False, nullable=False)
-    switch_mac = Column(String, nullable=True)
-    switch_name = Column(String, nullable=True)
-    switch_port = Column(Integer, nullable=True)
+    is_wired: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    switch_mac: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    switch_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    switch_port: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    __table_args__ = (
+        # History pages and CSV export: WHERE device_id ORDER BY connected_at
+        Index('ix_stalker_connection_history_device_connected', 'device_id', 'connected_at'),
+        # Dwell-time / favorite-AP analytics: wireless rows with an AP name, ranged on connected_at
+        Index(
+            'ix_stalker_connection_history_device_wired_connected',
+            'device_id', 'is_wired', 'connected_at',
+            sqlite_where=text('ap_name IS NOT NULL'),
+            postgresql_where=text('ap_name IS NOT NULL'),
+        ),
+        # Open and recently closed connections (dwell rollup catch-up)
+        Index('ix_stalker_connection_history_disconnected', 'disconnected_at'),
+        # Per-device open entries (TrackedDevice.open_history) and last disconnect
+        # (offline durations), both looked up on every refresh
+        Index('ix_stalker_connection_history_device_disconnected', 'device_id', 'disconnected_at'),
+    )
 
     # Relationship to device
-    device = relationship("TrackedDevice", back_populates="history")
+    device: Mapped["TrackedDevice"] = relationship(back_populates="history")
 
     def __repr__(self):
         return f"<ConnectionHistory(device_id={self.device_id}, ap={self.ap_name}, connected={self.connected_at})>"
@@ -77,21 +149,27 @@ class WebhookConfig(Base):
     """
     __tablename__ = "stalker_webhook_config"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String, nullable=False)
-    webhook_type = Column(String, nullable=False)  # 'slack', 'discord', 'n8n'
-    url = Column(String, nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    webhook_type: Mapped[str] = mapped_column(String, nullable=False)  # 'slack', 'discord', 'n8n'
+    url: Mapped[str] = mapped_column(String, nullable=False)
 
-    # Event triggers
-    event_device_connected = Column(Boolean, default=True, nullable=False)
-    event_device_disconnected = Column(Boolean, default=True, nullable=False)
-    event_device_roamed = Column(Boolean, default=True, nullable=False)
-    event_device_blocked = Column(Boolean, default=True, nullable=False)
-    event_device_unblocked = Column(Boolean, default=True, nullable=False)
+    # Event triggers - bitwise OR of EVT_* flags
+    event_mask: Mapped[int] = mapped_column(Integer, default=EVT_ALL, nullable=False)
 
-    enabled = Column(Boolean, default=True, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    last_triggered = Column(DateTime, nullable=True)
+    enabled: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    last_triggered: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    # Partial index over enabled rows only - event fan-out never looks at disabled webhooks
+    __table_args__ = (
+        Index(
+            'ix_stalker_webhook_config_enabled', 'enabled',
+            sqlite_where=text('enabled'), postgresql_where=text('enabled'),
+        ),
+    )
 
     def __repr__(self):
         return f"<WebhookConfig(name={self.name}, type={self.webhook_type}, enabled={self.enabled})>"
@@ -105,15 +183,18 @@ class HourlyPresence(Base):
     """
     __tablename__ = "stalker_hourly_presence"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    device_id = Column(Integer, ForeignKey("stalker_tracked_devices.id"), nullable=False, index=True)
-    day_of_week = Column(Integer, nullable=False)  # 0=Monday, 6=Sunday
-    hour_of_day = Column(Integer, nullable=False)  # 0-23
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    device_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("stalker_tracked_devices.id"), nullable=False, index=True
+    )
+    day_of_week: Mapped[int] = mapped_column(Integer, nullable=False)  # 0=Monday, 6=Sunday
+    hour_of_day: Mapped[int] = mapped_column(Integer, nullable=False)  # 0-23
 
     # Aggregated stats (updated hourly)
-    total_minutes_connected = Column(Integer, default=0, nullable=False)
-    sample_count = Column(Integer, default=0, nullable=False)  # Number of times this hour slot was sampled
-    last_updated = Column(DateTime, nullable=True)
+    total_minutes_connected: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Number of times this hour slot was sampled
+    sample_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_updated: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     # Unique constraint: one row per device per hour-slot
     __table_args__ = (
@@ -121,7 +202,36 @@ class HourlyPresence(Base):
     )
 
     # Relationship to device
-    device = relationship("TrackedDevice", back_populates="hourly_presence")
+    device: Mapped["TrackedDevice"] = relationship(back_populates="hourly_presence")
 
     def __repr__(self):
         return f"<HourlyPresence(device_id={self.device_id}, day={self.day_of_week}, hour={self.hour_of_day})>"
+
+
+class ApDwellDaily(Base):
+    """
+    Daily rollup of wireless connection time per device per AP.
+    One row per device, AP and UTC day the connections started on, covering
+    closed connections only. Maintained by the scheduler so the dwell-time
+    and favorite-AP analytics don't re-sum raw history on every request.
+    """
+    __tablename__ = "stalker_ap_dwell_daily"
+
+    device_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("stalker_tracked_devices.id"), primary_key=True
+    )
+    ap_name: Mapped[str] = mapped_column(String, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    minutes: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Most recent connection start on this day (favorite-AP tie-breaker)
+    last_connected_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_stalker_ap_dwell_daily_device_day', 'device_id', 'day'),
+    )
+
+    # Relationship to device
+    device: Mapped["TrackedDevice"] = relationship(back_populates="ap_dwell_daily")
+
+    def __repr__(self):
+        return f"<ApDwellDaily(device_id={self.device_id}, ap={self.ap_name}, day={self.day}, minutes={self.minutes})>"
@@ -1,12 +1,26 @@
 """
 Pydantic models for API requests and responses
 """
-from pydantic import BaseModel, Field, field_validator, field_serializer
+from pydantic import BaseModel, Field, computed_field, field_validator, field_serializer
 from typing import Optional, Dict, List
 from datetime import datetime, timezone
+from functools import lru_cache
 import re
 
+from tools.wifi_stalker.database import (
+    EVT_BLOCKED,
+    EVT_CONNECTED,
+    EVT_DISCONNECTED,
+    EVT_ROAMED,
+    EVT_UNBLOCKED,
+)
 
+# Already-normalized MAC (e.g. "aa:bb:cc:dd:ee:ff")
+MAC_CANONICAL_PATTERN = re.compile(r'[0-9a-f]{2}(?::[0-9a-f]{2}){5}')
+MAC_NON_HEX_PATTERN = re.compile(r'[^a-fA-F0-9]')
+
+
+@lru_cache(maxsize=4096)
 def normalize_mac_address(mac: str) -> str:
     """
     Normalize MAC address to lowercase colon-separated format
@@ -16,9 +30,15 @@ def normalize_mac_address(mac: str) -> str:
 
     Returns:
         Normalized MAC address (e.g., "aa:bb:cc:dd:ee:ff")
+
+    Results are memoized since the same MACs are normalized repeatedly.
     """
+    # Fast path: input is already in canonical form
+    if MAC_CANONICAL_PATTERN.fullmatch(mac):
+        return mac
+
     # Remove all non-alphanumeric characters
-    mac_clean = re.sub(r'[^a-fA-F0-9]', '', mac)
+    mac_clean = MAC_NON_HEX_PATTERN.sub('', mac)
 
     # Validate length
     if len(mac_clean) != 12:
@@ -103,6 +123,7 @@ class DeviceResponse(BaseModel):
 
     class Config:
         from_attributes = True
+        frozen = True
 
 
 class DeviceListResponse(BaseModel):
@@ -140,6 +161,7 @@ class HistoryEntry(BaseModel):
 
     class Config:
         from_attributes = True
+        frozen = True
 
 
 class HistoryListResponse(BaseModel):
@@ -274,6 +296,9 @@ class UniFiClientInfo(BaseModel):
     hostname: Optional[str] = None
     is_tracked: bool = False
 
+    class Config:
+        frozen = True
+
 
 class UniFiClientsResponse(BaseModel):
     """
@@ -340,21 +365,44 @@ class WebhookResponse(BaseModel):
     name: str
     webhook_type: str
     url: str
-    event_device_connected: bool
-    event_device_disconnected: bool
-    event_device_roamed: bool
-    event_device_blocked: bool
-    event_device_unblocked: bool
+    event_mask: int
     enabled: bool
     created_at: datetime
     last_triggered: Optional[datetime] = None
 
+    # Per-event flags derived from event_mask (kept for API compatibility)
+    @computed_field
+    @property
+    def event_device_connected(self) -> bool:
+        return bool(self.event_mask & EVT_CONNECTED)
+
+    @computed_field
+    @property
+    def event_device_disconnected(self) -> bool:
+        return bool(self.event_mask & EVT_DISCONNECTED)
+
+    @computed_field
+    @property
+    def event_device_roamed(self) -> bool:
+        return bool(self.event_mask & EVT_ROAMED)
+
+    @computed_field
+    @property
+    def event_device_blocked(self) -> bool:
+        return bool(self.event_mask & EVT_BLOCKED)
+
+    @computed_field
+    @property
+    def event_device_unblocked(self) -> bool:
+        return bool(self.event_mask & EVT_UNBLOCKED)
+
     @field_serializer('created_at', 'last_triggered')
     def serialize_dt(self, dt: Optional[datetime], _info) -> Optional[str]:
         return serialize_datetime(dt)
 
     class Config:
         from_attributes = True
+        frozen = True
 
 
 class WebhooksListResponse(BaseModel):
@@ -5,11 +5,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime, timezone
+from typing import Optional
 
+from shared import cache
 from shared.database import get_db_session
 from shared.models.unifi_config import UniFiConfig
 from shared.crypto import encrypt_password, decrypt_password, encrypt_api_key, decrypt_api_key
 from shared.unifi_client import UniFiClient
+from shared.unifi_session import get_shared_client, invalidate_shared_client
 from tools.wifi_stalker.models import (
     UniFiConfigCreate,
     UniFiConfigResponse,
@@ -72,6 +75,12 @@ async def save_unifi_config(
 
     await db.commit()
 
+    # Cached UniFi data and the shared session belong to the old controller
+    # config. Dropped only after the commit, so a refresh in between can't
+    # rebuild the session from the old config.
+    cache.invalidate_all()
+    await invalidate_shared_client()
+
     return SuccessResponse(
         success=True,
         message="UniFi configuration saved successfully"
@@ -160,39 +169,28 @@ async def test_unifi_connection(
 
 async def get_unifi_client(db: AsyncSession = Depends(get_db_session)) -> UniFiClient:
     """
-    Dependency to get a configured UniFi client instance
+    Dependency to get the shared, already-connected UniFi client
+
+    The session is created once and reused across requests (and with the
+    schedulers), so endpoints must not connect or disconnect it.
     """
-    # Get config from database
-    result = await db.execute(select(UniFiConfig).where(UniFiConfig.id == 1))
-    config = result.scalar_one_or_none()
+    client = await get_shared_client()
+    if client is not None:
+        return client
 
-    if not config:
+    result = await db.execute(select(UniFiConfig.id).where(UniFiConfig.id == 1))
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=404,
             detail="UniFi configuration not found. Please configure your UniFi controller first."
         )
+    raise HTTPException(status_code=503, detail="Failed to connect to UniFi controller")
 
-    # Decrypt credentials
-    password = None
-    api_key = None
 
-    try:
-        if config.password_encrypted:
-            password = decrypt_password(config.password_encrypted)
-        if config.api_key_encrypted:
-            api_key = decrypt_api_key(config.api_key_encrypted)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to decrypt UniFi credentials: {str(e)}"
-        )
+async def get_optional_unifi_client() -> Optional[UniFiClient]:
+    """
+    Dependency to get the shared UniFi client, or None if it isn't available
 
-    # Create and return UniFi client
-    return UniFiClient(
-        host=config.controller_url,
-        username=config.username,
-        password=password,
-        api_key=api_key,
-        site=config.site_id,
-        verify_ssl=config.verify_ssl
-    )
+    For endpoints that can still answer from the database alone.
+    """
+    return await get_shared_client()
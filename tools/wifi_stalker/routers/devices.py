@@ -5,17 +5,20 @@ import asyncio
 import csv
 import io
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, time, timedelta, timezone
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from sqlalchemy import func, select
+from sqlalchemy import Integer, Row, cast, exists, func, or_, select, union_all, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shared.database import get_db_session
+from shared import cache
+from shared.database import get_database, get_db_session, page_total
 from shared.unifi_client import UniFiClient
+from shared.unifi_session import get_shared_client, invalidate_shared_client
 from tools.wifi_stalker.database import (
+    ApDwellDaily,
     ConnectionHistory,
     HourlyPresence,
     TrackedDevice,
@@ -27,15 +30,20 @@ from tools.wifi_stalker.models import (
     DeviceResponse,
     DwellTimeResponse,
     FavoriteAPResponse,
+    HistoryEntry,
     HistoryListResponse,
     PresencePatternResponse,
     SuccessResponse,
     UniFiClientInfo,
     UniFiClientsResponse,
 )
-from tools.wifi_stalker.routers.config import get_unifi_client
+from tools.wifi_stalker.routers.config import get_optional_unifi_client, get_unifi_client
 from tools.wifi_stalker.scheduler import (
-    refresh_single_device,
+    connected_minutes,
+    get_dwell_rolled_through,
+    get_enabled_webhooks,
+    mark_webhooks_triggered,
+    schedule_single_device_refresh,
     trigger_webhooks,
 )
 
@@ -43,6 +51,284 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
 
+# Number of CSV rows buffered per chunk when streaming history exports
+EXPORT_CHUNK_ROWS = 100
+
+# History export header, encoded once (none of the names need CSV quoting)
+_EXPORT_HEADER = (','.join([
+    'Device Name',
+    'MAC Address',
+    'Connection Type',
+    'AP/Switch Name',
+    'AP/Switch MAC',
+    'SSID',
+    'Switch Port',
+    'Connected At',
+    'Disconnected At',
+    'Duration (seconds)',
+    'Signal Strength (dBm)'
+]) + '\r\n').encode()
+
+# Response fields read straight off the ORM rows
+_DEVICE_FIELDS = tuple(DeviceResponse.model_fields)
+_HISTORY_FIELDS = tuple(HistoryEntry.model_fields)
+
+# Column projections for read paths that don't need full ORM entities
+_DEVICE_COLUMNS = tuple(getattr(TrackedDevice, field) for field in _DEVICE_FIELDS)
+_HISTORY_COLUMNS = tuple(getattr(ConnectionHistory, field) for field in _HISTORY_FIELDS)
+
+
+def _device_response(device) -> DeviceResponse:
+    """
+    Build a DeviceResponse from a TrackedDevice entity or projected row
+    without re-validating it.
+
+    Rows in our own database already passed validation on the way in, so
+    model_construct() just copies the attributes across.
+    """
+    return DeviceResponse.model_construct(
+        **{field: getattr(device, field) for field in _DEVICE_FIELDS}
+    )
+
+
+def _history_entry(entry) -> HistoryEntry:
+    """
+    Build a HistoryEntry from a ConnectionHistory entity or projected row
+    without re-validating it.
+    """
+    return HistoryEntry.model_construct(
+        **{field: getattr(entry, field) for field in _HISTORY_FIELDS}
+    )
+
+
+# Live UniFi client data shown in device details: response field -> client key
+# (essid maps to current_ssid, and UniFi's OUI lookup is the manufacturer)
+_LIVE_CLIENT_FIELDS = {
+    "hostname": "hostname",
+    "tx_rate": "tx_rate",
+    "rx_rate": "rx_rate",
+    "channel": "channel",
+    "radio": "radio",
+    "uptime": "uptime",
+    "tx_bytes": "tx_bytes",
+    "rx_bytes": "rx_bytes",
+    "current_ssid": "essid",
+    "manufacturer": "oui",
+}
+_LIVE_DETAIL_FIELDS = tuple(_LIVE_CLIENT_FIELDS)
+_LIVE_CLIENT_KEYS = tuple(_LIVE_CLIENT_FIELDS.values())
+
+# Device detail fields copied from the stored device (blocked status always
+# comes from UniFi instead)
+_DETAIL_STORED_FIELDS = tuple(
+    field for field in DeviceDetailResponse.model_fields
+    if hasattr(TrackedDevice, field) and field != "is_blocked"
+)
+
+
+# TrackedDevice fields read by trigger_webhooks()
+_WEBHOOK_DEVICE_COLUMNS = (
+    TrackedDevice.mac_address,
+    TrackedDevice.friendly_name,
+    TrackedDevice.current_ap_name,
+    TrackedDevice.current_signal_strength,
+)
+
+
+async def get_tracked_device(
+    device_id: int,
+    db: AsyncSession = Depends(get_db_session)
+) -> TrackedDevice:
+    """
+    Dependency that loads the tracked device from the path, or raises a 404
+
+    Shares the request's database session, so endpoints can modify and commit
+    the returned entity.
+    """
+    result = await db.execute(
+        select(TrackedDevice).where(TrackedDevice.id == device_id)
+    )
+    device = result.scalar_one_or_none()
+
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    return device
+
+
+async def _ensure_device_exists(db: AsyncSession, device_id: int) -> None:
+    """
+    Raise a 404 unless a tracked device with this ID exists
+    """
+    found = await db.scalar(select(exists().where(TrackedDevice.id == device_id)))
+    if not found:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+
+async def _get_device_columns(db: AsyncSession, device_id: int, *columns) -> Row:
+    """
+    Fetch only the given TrackedDevice columns, raising a 404 if the device doesn't exist
+    """
+    result = await db.execute(select(*columns).where(TrackedDevice.id == device_id))
+    device = result.one_or_none()
+    if device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return device
+
+
+async def _get_clients(unifi_client: UniFiClient) -> dict:
+    """
+    Get connected UniFi clients, served from a short-lived cache when fresh
+    """
+    clients = cache.get_unifi_clients(unifi_client.site)
+    if clients is None:
+        clients = await unifi_client.get_clients()
+        cache.set_unifi_clients(unifi_client.site, clients)
+    return clients
+
+
+async def _is_client_blocked(unifi_client: UniFiClient, mac: str) -> bool:
+    """
+    Check whether a client is blocked in UniFi, served from cache when fresh
+
+    Looks the MAC up in the site's blocked client set (one UniFi request for
+    every device, also kept fresh by the refresh task) unless this client was
+    just blocked or unblocked here.
+    """
+    blocked = cache.get_client_blocked(mac)
+    if blocked is not None:
+        return blocked
+
+    blocked_macs = cache.get_blocked_clients(unifi_client.site)
+    if blocked_macs is None:
+        blocked_macs = await unifi_client.get_blocked_clients()
+        if blocked_macs is None:
+            return False
+        cache.set_blocked_clients(unifi_client.site, blocked_macs)
+    return mac in blocked_macs
+
+
+async def _run_with_reconnect(unifi_client: UniFiClient, action) -> bool:
+    """
+    Run a UniFi action on the shared session, reconnecting and retrying once
+    if the controller rejected the session (expired login).
+
+    Any other failure is returned as is: the session is shared with every
+    scheduler, and each reconnect is a fresh login.
+
+    Args:
+        unifi_client: Shared UniFi client
+        action: Callable taking a UniFiClient and returning an awaitable bool
+    """
+    if await action(unifi_client):
+        return True
+    if not unifi_client.session_expired:
+        return False
+
+    logger.info("UniFi session expired, reconnecting shared session and retrying")
+    await invalidate_shared_client(unifi_client)
+    fresh_client = await get_shared_client()
+    if fresh_client is None:
+        return False
+    return await action(fresh_client)
+
+
+def _csv_line(values: list, buffer: io.StringIO, writer) -> str:
+    """
+    Format one CSV line the same way csv.writer does.
+
+    Most rows hold nothing that needs quoting, so they are joined directly;
+    a row with a comma, quote or line break in any field falls back to the
+    csv writer on a reused buffer.
+    """
+    cells = ['' if value is None else str(value) for value in values]
+    line = ','.join(cells)
+    if (
+        line.count(',') == len(cells) - 1
+        and '"' not in line
+        and '\n' not in line
+        and '\r' not in line
+    ):
+        return line + '\r\n'
+
+    buffer.seek(0)
+    buffer.truncate(0)
+    writer.writerow(cells)
+    return buffer.getvalue()
+
+
+def _client_names_from_dict(client: dict) -> tuple:
+    """
+    Get (friendly_name, hostname) from a UniFi OS client dict
+    """
+    return client.get('name') or client.get('friendly_name'), client.get('hostname')
+
+
+def _client_names_from_obj(client) -> tuple:
+    """
+    Get (friendly_name, hostname) from an aiounifi client object
+    """
+    friendly_name = getattr(client, 'name', None) or getattr(client, 'friendly_name', None)
+    return friendly_name, getattr(client, 'hostname', None)
+
+
+def _ap_dwell_query(device_id: int, now: datetime, start_time: Optional[datetime]):
+    """
+    Select minutes connected and latest connection start per AP for a
+    device's wireless connections since start_time (or all time).
+
+    Whole days already in the daily dwell rollup are read from there. The
+    partial first day of the window, connections that are still open, and
+    connections closed after the rollup cutoff are summed from raw history.
+    """
+    history_filter = [
+        ConnectionHistory.device_id == device_id,
+        ConnectionHistory.is_wired == False,
+        ConnectionHistory.ap_name.isnot(None),
+    ]
+    if start_time:
+        history_filter.append(ConnectionHistory.connected_at >= start_time)
+
+    rolled_through = get_dwell_rolled_through()
+    if rolled_through is None:
+        # Rollup not rebuilt yet since startup - aggregate raw history only
+        return select(
+            ConnectionHistory.ap_name,
+            func.sum(connected_minutes(now)).label("minutes"),
+            func.max(ConnectionHistory.connected_at).label("last_connected_at"),
+        ).where(*history_filter).group_by(ConnectionHistory.ap_name)
+
+    not_rolled_up = [
+        ConnectionHistory.disconnected_at.is_(None),
+        ConnectionHistory.disconnected_at > rolled_through,
+    ]
+    rollup_query = select(
+        ApDwellDaily.ap_name,
+        ApDwellDaily.minutes,
+        ApDwellDaily.last_connected_at,
+    ).where(ApDwellDaily.device_id == device_id)
+
+    if start_time:
+        # The window starts part-way through a day, so that day comes from raw history
+        first_full_day = start_time.date() + timedelta(days=1)
+        not_rolled_up.append(
+            ConnectionHistory.connected_at < datetime.combine(first_full_day, time.min, timezone.utc)
+        )
+        rollup_query = rollup_query.where(ApDwellDaily.day >= first_full_day)
+
+    history_query = select(
+        ConnectionHistory.ap_name,
+        connected_minutes(now).label("minutes"),
+        ConnectionHistory.connected_at.label("last_connected_at"),
+    ).where(*history_filter, or_(*not_rolled_up))
+
+    combined = union_all(history_query, rollup_query).subquery()
+    return select(
+        combined.c.ap_name,
+        func.sum(combined.c.minutes).label("minutes"),
+        func.max(combined.c.last_connected_at).label("last_connected_at"),
+    ).group_by(combined.c.ap_name)
+
 
 @router.post("", response_model=DeviceResponse, status_code=201)
 async def create_device(
@@ -64,24 +350,23 @@ async def create_device(
             detail=f"Device with MAC address {device.mac_address} is already being tracked"
         )
 
-    # Create new device
+    # Create new device (added_at and is_connected come from the model defaults)
     new_device = TrackedDevice(
         mac_address=device.mac_address,
         friendly_name=device.friendly_name,
-        site_id=device.site_id,
-        added_at=datetime.now(timezone.utc),
-        is_connected=False
+        site_id=device.site_id
     )
 
     db.add(new_device)
     await db.commit()
     await db.refresh(new_device)
+    cache.invalidate_tracked_macs()
 
     # Immediately check device status from UniFi (don't wait for scheduled refresh)
     # Run in background so we can return the response quickly
-    asyncio.create_task(refresh_single_device(new_device.id))
+    schedule_single_device_refresh(new_device.id)
 
-    return new_device
+    return _device_response(new_device)
 
 
 @router.get("", response_model=DeviceListResponse)
@@ -91,142 +376,96 @@ async def list_devices(
     """
     Get all tracked devices
     """
+    # Only the response columns are needed, so skip ORM entity hydration
     result = await db.execute(
-        select(TrackedDevice).order_by(TrackedDevice.added_at.desc())
+        select(*_DEVICE_COLUMNS).order_by(TrackedDevice.added_at.desc())
     )
-    devices = result.scalars().all()
+    devices = result.all()
 
     return DeviceListResponse(
-        devices=devices,
+        devices=[_device_response(device) for device in devices],
         total=len(devices)
     )
 
 
 @router.get("/{device_id}", response_model=DeviceResponse)
 async def get_device(
-    device_id: int,
-    db: AsyncSession = Depends(get_db_session)
+    device: TrackedDevice = Depends(get_tracked_device)
 ):
     """
     Get a specific device by ID
     """
-    result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
-    )
-    device = result.scalar_one_or_none()
-
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
-
-    return device
+    return _device_response(device)
 
 
 @router.get("/{device_id}/details", response_model=DeviceDetailResponse)
 async def get_device_details(
-    device_id: int,
-    unifi_client: UniFiClient = Depends(get_unifi_client),
-    db: AsyncSession = Depends(get_db_session)
+    device: TrackedDevice = Depends(get_tracked_device),
+    unifi_client: Optional[UniFiClient] = Depends(get_optional_unifi_client)
 ):
     """
     Get detailed device information including live UniFi data
     """
-    # Get device from database
-    result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
-    )
-    device = result.scalar_one_or_none()
-
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    # Basic device info straight from the ORM entity; stored rows already
+    # passed validation on the way in (see _device_response())
+    detail_data = {field: getattr(device, field) for field in _DETAIL_STORED_FIELDS}
 
-    # Prepare response with basic device info
-    detail_data = {
-        "id": device.id,
-        "mac_address": device.mac_address,
-        "friendly_name": device.friendly_name,
-        "added_at": device.added_at,
-        "last_seen": device.last_seen,
-        "current_ap_mac": device.current_ap_mac,
-        "current_ap_name": device.current_ap_name,
-        "current_ssid": device.current_ssid,
-        "current_ip_address": device.current_ip_address,
-        "current_signal_strength": device.current_signal_strength,
-        "is_connected": device.is_connected,
-        "site_id": device.site_id,
-        "is_blocked": False,  # Default, will be updated from UniFi
-        # Wired device fields
-        "is_wired": device.is_wired,
-        "current_switch_mac": device.current_switch_mac,
-        "current_switch_name": device.current_switch_name,
-        "current_switch_port": device.current_switch_port,
-    }
+    # Live UniFi data laid over the stored fields. Blocked status defaults to
+    # False and comes from UniFi, not the stored flag.
+    live_data = {"is_blocked": False}
 
     # Always try to get blocked status and live data from UniFi
+    if unifi_client is None:
+        logger.warning(f"No UniFi session available for device details {device.id}")
+        return DeviceDetailResponse.model_construct(**detail_data, **live_data)
+
     try:
-        connected = await unifi_client.connect()
-        if not connected:
-            logger.warning(f"Could not connect to UniFi for device details {device_id}")
-            return DeviceDetailResponse(**detail_data)
-        try:
-            mac_normalized = device.mac_address.lower()
-
-            # Always check blocked status (works even for disconnected devices)
-            detail_data["is_blocked"] = await unifi_client.is_client_blocked(mac_normalized)
-
-            # Get live data if device is connected
-            if device.is_connected:
-                clients = await unifi_client.get_clients()
-                client = clients.get(mac_normalized)
-
-                if client:
-                    # Extract UniFi data (handle both dict and object formats)
-                    live_fields = [
-                        "hostname", "tx_rate", "rx_rate", "channel",
-                        "radio", "uptime", "tx_bytes", "rx_bytes"
-                    ]
-                    for field in live_fields:
-                        if isinstance(client, dict):
-                            detail_data[field] = client.get(field)
-                        else:
-                            detail_data[field] = getattr(client, field, None)
-                    # Map essid to current_ssid
-                    if isinstance(client, dict):
-                        detail_data["current_ssid"] = client.get("essid")
-                    else:
-                        detail_data["current_ssid"] = getattr(client, "essid", None)
-                    # Get manufacturer from UniFi's OUI data
-                    if isinstance(client, dict):
-                        detail_data["manufacturer"] = client.get("oui")
-                    else:
-                        detail_data["manufacturer"] = getattr(client, "oui", None)
-
-        finally:
-            await unifi_client.disconnect()
-    except Exception:
+        # Stored MACs and UniFi client keys are both lowercase
+        mac_normalized = device.mac_address
+
+        # Always check blocked status (works even for disconnected devices),
+        # fetching live clients alongside it if the device is connected
+        if device.is_connected:
+            live_data["is_blocked"], clients = await asyncio.gather(
+                _is_client_blocked(unifi_client, mac_normalized),
+                _get_clients(unifi_client),
+            )
+            client = clients.get(mac_normalized)
+        else:
+            live_data["is_blocked"] = await _is_client_blocked(unifi_client, mac_normalized)
+            client = None
+
+        if client:
+            # Extract UniFi data (handle both dict and object formats)
+            if isinstance(client, dict):
+                live_values = map(client.get, _LIVE_CLIENT_KEYS)
+            else:
+                live_values = (getattr(client, key, None) for key in _LIVE_CLIENT_KEYS)
+            live_data.update(zip(_LIVE_DETAIL_FIELDS, live_values))
+    except Exception as e:
         # If we can't get live data, just return basic info with default blocked status
-        pass
+        logger.warning(f"Could not get live UniFi data for device {device.id}: {e}")
+
+    # Reconnect on the next request if the controller rejected the shared session
+    if unifi_client.session_expired:
+        await invalidate_shared_client(unifi_client)
 
-    return DeviceDetailResponse(**detail_data)
+    # Live values come straight from UniFi, so run them through validation
+    # (model_construct() would pass e.g. a string channel through as-is)
+    return DeviceDetailResponse.model_validate({**detail_data, **live_data})
 
 
 @router.delete("/{device_id}", response_model=SuccessResponse)
 async def delete_device(
-    device_id: int,
+    device: TrackedDevice = Depends(get_tracked_device),
     db: AsyncSession = Depends(get_db_session)
 ):
     """
     Remove a device from tracking
     """
-    result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
-    )
-    device = result.scalar_one_or_none()
-
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
-
     await db.delete(device)
     await db.commit()
+    cache.invalidate_tracked_macs()
 
     return SuccessResponse(
         success=True,
@@ -245,33 +484,26 @@ async def get_device_history(
     Get roaming history for a specific device
     """
     # Check if device exists
-    device_result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
-    )
-    device = device_result.scalar_one_or_none()
+    await _ensure_device_exists(db, device_id)
 
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
-
-    # Get history entries
+    # Get history entries, with the total count carried on every row by a
+    # window function so the page and count come back in one query
     history_result = await db.execute(
-        select(ConnectionHistory)
+        select(*_HISTORY_COLUMNS, func.count().over().label("total_count"))
         .where(ConnectionHistory.device_id == device_id)
         .order_by(ConnectionHistory.connected_at.desc())
         .limit(limit)
         .offset(offset)
     )
-    history_entries = history_result.scalars().all()
-
-    # Get total count
-    count_result = await db.execute(
+    history_entries = history_result.all()
+    total = await page_total(
+        db, history_entries, offset,
         select(func.count()).where(ConnectionHistory.device_id == device_id)
     )
-    total = count_result.scalar()
 
     return HistoryListResponse(
         device_id=device_id,
-        history=history_entries,
+        history=[_history_entry(entry) for entry in history_entries],
         total=total
     )
 
@@ -285,37 +517,38 @@ async def block_device(
     """
     Block a device in UniFi
     """
-    # Get device from database
-    result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
+    # Get the fields needed for UniFi and the webhook payload
+    device = await _get_device_columns(db, device_id, *_WEBHOOK_DEVICE_COLUMNS)
+
+    # Block the device through the shared UniFi session
+    success = await _run_with_reconnect(
+        unifi_client, lambda client: client.block_client(device.mac_address)
     )
-    device = result.scalar_one_or_none()
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to block device in UniFi")
+
+    # Update blocked status in database
+    await db.execute(
+        update(TrackedDevice)
+        .where(TrackedDevice.id == device_id)
+        .values(is_blocked=True)
+    )
+    await db.commit()
 
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    # Keep cached UniFi state in line with the change
+    cache.set_client_blocked(device.mac_address, True)
+    cache.invalidate_blocked_clients(unifi_client.site)
+    cache.invalidate_unifi_clients(unifi_client.site)
 
-    # Connect to UniFi and block the device
-    connected = await unifi_client.connect()
-    if not connected:
-        raise HTTPException(status_code=503, detail="Failed to connect to UniFi controller")
-    try:
-        success = await unifi_client.block_client(device.mac_address)
-        if success:
-            # Update blocked status in database
-            device.is_blocked = True
-            await db.commit()
-
-            # Trigger blocked webhook
-            await trigger_webhooks(db, 'blocked', device)
-
-            return SuccessResponse(
-                success=True,
-                message=f"Device {device.mac_address} blocked successfully"
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to block device in UniFi")
-    finally:
-        await unifi_client.disconnect()
+    # Trigger blocked webhook
+    webhooks = await get_enabled_webhooks(db)
+    await mark_webhooks_triggered(db, await trigger_webhooks(webhooks, 'blocked', device))
+    await db.commit()
+
+    return SuccessResponse(
+        success=True,
+        message=f"Device {device.mac_address} blocked successfully"
+    )
 
 
 @router.post("/{device_id}/unblock", response_model=SuccessResponse)
@@ -327,37 +560,38 @@ async def unblock_device(
     """
     Unblock a device in UniFi
     """
-    # Get device from database
-    result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
+    # Get the fields needed for UniFi and the webhook payload
+    device = await _get_device_columns(db, device_id, *_WEBHOOK_DEVICE_COLUMNS)
+
+    # Unblock the device through the shared UniFi session
+    success = await _run_with_reconnect(
+        unifi_client, lambda client: client.unblock_client(device.mac_address)
     )
-    device = result.scalar_one_or_none()
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to unblock device in UniFi")
+
+    # Update blocked status in database
+    await db.execute(
+        update(TrackedDevice)
+        .where(TrackedDevice.id == device_id)
+        .values(is_blocked=False)
+    )
+    await db.commit()
 
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    # Keep cached UniFi state in line with the change
+    cache.set_client_blocked(device.mac_address, False)
+    cache.invalidate_blocked_clients(unifi_client.site)
+    cache.invalidate_unifi_clients(unifi_client.site)
 
-    # Connect to UniFi and unblock the device
-    connected = await unifi_client.connect()
-    if not connected:
-        raise HTTPException(status_code=503, detail="Failed to connect to UniFi controller")
-    try:
-        success = await unifi_client.unblock_client(device.mac_address)
-        if success:
-            # Update blocked status in database
-            device.is_blocked = False
-            await db.commit()
-
-            # Trigger unblocked webhook
-            await trigger_webhooks(db, 'unblocked', device)
-
-            return SuccessResponse(
-                success=True,
-                message=f"Device {device.mac_address} unblocked successfully"
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to unblock device in UniFi")
-    finally:
-        await unifi_client.disconnect()
+    # Trigger unblocked webhook
+    webhooks = await get_enabled_webhooks(db)
+    await mark_webhooks_triggered(db, await trigger_webhooks(webhooks, 'unblocked', device))
+    await db.commit()
+
+    return SuccessResponse(
+        success=True,
+        message=f"Device {device.mac_address} unblocked successfully"
+    )
 
 
 @router.put("/{device_id}/unifi-name", response_model=SuccessResponse)
@@ -370,34 +604,28 @@ async def update_unifi_name(
     """
     Update device friendly name in UniFi
     """
-    # Get device from database
-    result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
-    )
-    device = result.scalar_one_or_none()
+    # Get device MAC from database
+    device = await _get_device_columns(db, device_id, TrackedDevice.mac_address)
 
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    # Update the name through the shared UniFi session
+    success = await _run_with_reconnect(
+        unifi_client, lambda client: client.set_client_name(device.mac_address, name)
+    )
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to update device name in UniFi")
+
+    # Also update in our database
+    await db.execute(
+        update(TrackedDevice)
+        .where(TrackedDevice.id == device_id)
+        .values(friendly_name=name)
+    )
+    await db.commit()
 
-    # Connect to UniFi and update the name
-    connected = await unifi_client.connect()
-    if not connected:
-        raise HTTPException(status_code=503, detail="Failed to connect to UniFi controller")
-    try:
-        success = await unifi_client.set_client_name(device.mac_address, name)
-        if success:
-            # Also update in our database
-            device.friendly_name = name
-            await db.commit()
-
-            return SuccessResponse(
-                success=True,
-                message=f"Device name updated to '{name}' in UniFi and Wi-Fi Stalker"
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to update device name in UniFi")
-    finally:
-        await unifi_client.disconnect()
+    return SuccessResponse(
+        success=True,
+        message=f"Device name updated to '{name}' in UniFi and Wi-Fi Stalker"
+    )
 
 
 @router.get("/discover/unifi", response_model=UniFiClientsResponse)
@@ -413,52 +641,50 @@ async def discover_unifi_clients(
     """
     try:
         # Get all tracked devices to mark which ones are already tracked
-        tracked_result = await db.execute(select(TrackedDevice))
-        tracked_devices = tracked_result.scalars().all()
-        tracked_macs = {device.mac_address.lower() for device in tracked_devices}
-
-        # Connect to UniFi and get clients
-        connected = await unifi_client.connect()
-        if not connected:
-            raise HTTPException(status_code=503, detail="Failed to connect to UniFi controller")
-        try:
-            clients_dict = await unifi_client.get_clients()
-
-            # Build response list
-            client_list = []
-            for mac, client in clients_dict.items():
-                # Handle both dict (UniFi OS) and object (aiounifi) formats
-                if isinstance(client, dict):
-                    friendly_name = client.get('name') or client.get('friendly_name')
-                    hostname = client.get('hostname')
-                else:
-                    friendly_name = getattr(client, 'name', None) or getattr(client, 'friendly_name', None)
-                    hostname = getattr(client, 'hostname', None)
-
-                # Use friendly name if exists, otherwise use hostname
-                display_name = friendly_name or hostname
-                # Only show hostname separately if it differs from the display name
-                show_hostname = hostname if friendly_name and friendly_name != hostname else None
-
-                client_list.append(UniFiClientInfo(
-                    mac_address=mac.upper(),
-                    name=display_name,
-                    hostname=show_hostname,
-                    is_tracked=mac.lower() in tracked_macs,
-                ))
-
-            # Sort by name (tracked devices first, then alphabetically)
-            client_list.sort(key=lambda c: (not c.is_tracked, c.name or c.mac_address))
-
-            return UniFiClientsResponse(
-                clients=client_list,
-                total=len(client_list)
-            )
-
-        finally:
-            await unifi_client.disconnect()
+        tracked_macs = cache.get_tracked_macs()
+        if tracked_macs is None:
+            tracked_result = await db.execute(select(TrackedDevice.mac_address))
+            tracked_macs = set(tracked_result.scalars())
+            cache.set_tracked_macs(tracked_macs)
+
+        clients_dict = await _get_clients(unifi_client)
+
+        # Handle both dict (UniFi OS) and object (aiounifi) formats; every
+        # client in one response has the same shape, so pick the extractor once
+        if clients_dict and isinstance(next(iter(clients_dict.values())), dict):
+            extract_names = _client_names_from_dict
+        else:
+            extract_names = _client_names_from_obj
+
+        # Build response list
+        client_list = []
+        for mac, client in clients_dict.items():
+            friendly_name, hostname = extract_names(client)
+
+            # Use friendly name if exists, otherwise use hostname
+            display_name = friendly_name or hostname
+            # Only show hostname separately if it differs from the display name
+            show_hostname = hostname if friendly_name and friendly_name != hostname else None
+
+            client_list.append(UniFiClientInfo(
+                mac_address=mac.upper(),
+                name=display_name,
+                hostname=show_hostname,
+                is_tracked=mac in tracked_macs,
+            ))
+
+        # Sort by name (tracked devices first, then alphabetically)
+        client_list.sort(key=lambda c: (not c.is_tracked, c.name or c.mac_address))
+
+        return UniFiClientsResponse(
+            clients=client_list,
+            total=len(client_list)
+        )
 
     except Exception as e:
+        # Reconnect on the next request if the controller rejected the shared session
+        if unifi_client.session_expired:
+            await invalidate_shared_client(unifi_client)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get UniFi clients: {str(e)}"
@@ -475,17 +701,26 @@ async def export_device_history(
     """
     Export device connection history as CSV
     """
-    # Get device from database
-    result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
+    # Get device name and MAC from database
+    device = await _get_device_columns(
+        db, device_id, TrackedDevice.friendly_name, TrackedDevice.mac_address
     )
-    device = result.scalar_one_or_none()
-
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
 
-    # Build query for history
-    query = select(ConnectionHistory).where(
+    # Build query for history, selecting just the exported columns so rows
+    # stream as plain tuples without ORM entity hydration
+    query = select(
+        ConnectionHistory.is_wired,
+        ConnectionHistory.ap_name,
+        ConnectionHistory.ap_mac,
+        ConnectionHistory.switch_name,
+        ConnectionHistory.switch_mac,
+        ConnectionHistory.switch_port,
+        ConnectionHistory.ssid,
+        ConnectionHistory.connected_at,
+        ConnectionHistory.disconnected_at,
+        ConnectionHistory.duration_seconds,
+        ConnectionHistory.signal_strength,
+    ).where(
         ConnectionHistory.device_id == device_id
     )
 
@@ -507,57 +742,62 @@ async def export_device_history(
     # Order by connected_at descending (most recent first)
     query = query.order_by(ConnectionHistory.connected_at.desc())
 
-    # Execute query
-    result = await db.execute(query)
-    history_entries = result.scalars().all()
-
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Write header
-    writer.writerow([
-        'Device Name',
-        'MAC Address',
-        'Connection Type',
-        'AP/Switch Name',
-        'AP/Switch MAC',
-        'SSID',
-        'Switch Port',
-        'Connected At',
-        'Disconnected At',
-        'Duration (seconds)',
-        'Signal Strength (dBm)'
-    ])
-
-    # Write data rows
-    for entry in history_entries:
-        # Determine connection type and location
-        connection_type = 'Wired' if entry.is_wired else 'Wireless'
-        location_name = entry.switch_name if entry.is_wired else entry.ap_name
-        location_mac = entry.switch_mac if entry.is_wired else entry.ap_mac
-        switch_port = entry.switch_port if entry.is_wired else '-'
-
-        writer.writerow([
-            device.friendly_name or 'Unnamed Device',
-            device.mac_address,
-            connection_type,
-            location_name or '-',
-            location_mac or '-',
-            entry.ssid or '-',
-            switch_port,
-            entry.connected_at.isoformat() if entry.connected_at else '-',
-            entry.disconnected_at.isoformat() if entry.disconnected_at else '-',
-            entry.duration_seconds if entry.duration_seconds else '-',
-            entry.signal_strength if entry.signal_strength else '-'
-        ])
-
-    # Prepare response
-    output.seek(0)
-    filename = f"device-history-{device.mac_address.replace(':', '')}.csv"
+    device_name = device.friendly_name or 'Unnamed Device'
+    device_mac = device.mac_address
+
+    async def csv_chunks():
+        """Stream CSV rows straight from the database cursor in small batches"""
+        # Scratch buffer for the rare rows that need csv quoting
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        yield _EXPORT_HEADER
+
+        # The body is sent after the endpoint returns, possibly after the
+        # request session has closed, so stream from a session of our own
+        async with get_database().session() as session:
+            result = await session.stream(query)
+            lines = []
+
+            # Write data rows
+            async for entry in result:
+                # Determine connection type and location
+                if entry.is_wired:
+                    connection_type = 'Wired'
+                    location_name = entry.switch_name
+                    location_mac = entry.switch_mac
+                    switch_port = entry.switch_port
+                else:
+                    connection_type = 'Wireless'
+                    location_name = entry.ap_name
+                    location_mac = entry.ap_mac
+                    switch_port = '-'
+
+                lines.append(_csv_line([
+                    device_name,
+                    device_mac,
+                    connection_type,
+                    location_name or '-',
+                    location_mac or '-',
+                    entry.ssid or '-',
+                    switch_port,
+                    entry.connected_at.isoformat() if entry.connected_at else '-',
+                    entry.disconnected_at.isoformat() if entry.disconnected_at else '-',
+                    entry.duration_seconds if entry.duration_seconds else '-',
+                    entry.signal_strength if entry.signal_strength else '-'
+                ], buffer, writer))
+
+                if len(lines) >= EXPORT_CHUNK_ROWS:
+                    yield ''.join(lines).encode()
+                    lines.clear()
+
+            if lines:
+                yield ''.join(lines).encode()
+
+    filename = f"device-history-{device_mac.replace(':', '')}.csv"
 
     return StreamingResponse(
-        iter([output.getvalue()]),
+        csv_chunks(),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -580,13 +820,7 @@ async def get_dwell_time(
         window: Time window - "24h", "7d", "30d", or "all"
     """
     # Check if device exists
-    device_result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
-    )
-    device = device_result.scalar_one_or_none()
-
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    await _ensure_device_exists(db, device_id)
 
     # Calculate time window
     now = datetime.now(timezone.utc)
@@ -599,44 +833,9 @@ async def get_dwell_time(
     else:  # "all"
         start_time = None
 
-    # Build query for connection history (wireless only)
-    query = select(ConnectionHistory).where(
-        ConnectionHistory.device_id == device_id,
-        ConnectionHistory.is_wired == False,
-        ConnectionHistory.ap_name.isnot(None)
-    )
-
-    if start_time:
-        query = query.where(ConnectionHistory.connected_at >= start_time)
-
-    result = await db.execute(query)
-    history_entries = result.scalars().all()
-
-    # Aggregate time by AP
-    ap_times = {}
-    for entry in history_entries:
-        ap_name = entry.ap_name
-        if not ap_name:
-            continue
-
-        # Calculate duration
-        if entry.duration_seconds:
-            duration_minutes = entry.duration_seconds // 60
-        elif entry.disconnected_at:
-            duration = (entry.disconnected_at - entry.connected_at).total_seconds()
-            duration_minutes = int(duration // 60)
-        else:
-            # Still connected - calculate from connected_at to now
-            connected_at = entry.connected_at
-            if connected_at.tzinfo is None:
-                connected_at = connected_at.replace(tzinfo=timezone.utc)
-            duration = (now - connected_at).total_seconds()
-            duration_minutes = int(duration // 60)
-
-        if ap_name in ap_times:
-            ap_times[ap_name] += duration_minutes
-        else:
-            ap_times[ap_name] = duration_minutes
+    # Aggregate time per AP in SQL (wireless only)
+    result = await db.execute(_ap_dwell_query(device_id, now, start_time))
+    ap_times = {row.ap_name: row.minutes for row in result}
 
     total_minutes = sum(ap_times.values())
 
@@ -657,81 +856,35 @@ async def get_favorite_ap(
     Uses most recent connection as tie-breaker.
     """
     # Check if device exists
-    device_result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
-    )
-    device = device_result.scalar_one_or_none()
-
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    await _ensure_device_exists(db, device_id)
 
     # Calculate 30-day window
     now = datetime.now(timezone.utc)
     start_time = now - timedelta(days=30)
 
-    # Get connection history for 30 days (wireless only)
+    # Aggregate time per AP over 30 days (wireless only) and pick the top one,
+    # using the most recent connection as tie-breaker
+    ap_dwell = _ap_dwell_query(device_id, now, start_time).subquery()
     result = await db.execute(
-        select(ConnectionHistory).where(
-            ConnectionHistory.device_id == device_id,
-            ConnectionHistory.is_wired == False,
-            ConnectionHistory.ap_name.isnot(None),
-            ConnectionHistory.connected_at >= start_time
+        select(
+            ap_dwell.c.ap_name,
+            func.round(ap_dwell.c.minutes / 60.0, 1).label("total_hours"),
         )
+        .order_by(ap_dwell.c.minutes.desc(), ap_dwell.c.last_connected_at.desc())
+        .limit(1)
     )
-    history_entries = result.scalars().all()
-
-    if not history_entries:
-        return FavoriteAPResponse(
-            ap_name=None,
-            total_hours=0.0,
-            has_data=False
-        )
-
-    # Aggregate time by AP, tracking most recent connection
-    ap_data = {}  # ap_name -> {"minutes": int, "last_seen": datetime}
-
-    for entry in history_entries:
-        ap_name = entry.ap_name
-        if not ap_name:
-            continue
+    favorite = result.first()
 
-        # Calculate duration
-        if entry.duration_seconds:
-            duration_minutes = entry.duration_seconds // 60
-        elif entry.disconnected_at:
-            duration = (entry.disconnected_at - entry.connected_at).total_seconds()
-            duration_minutes = int(duration // 60)
-        else:
-            # Still connected
-            connected_at = entry.connected_at
-            if connected_at.tzinfo is None:
-                connected_at = connected_at.replace(tzinfo=timezone.utc)
-            duration = (now - connected_at).total_seconds()
-            duration_minutes = int(duration // 60)
-
-        if ap_name not in ap_data:
-            ap_data[ap_name] = {"minutes": 0, "last_seen": entry.connected_at}
-
-        ap_data[ap_name]["minutes"] += duration_minutes
-        if entry.connected_at > ap_data[ap_name]["last_seen"]:
-            ap_data[ap_name]["last_seen"] = entry.connected_at
-
-    if not ap_data:
+    if favorite is None:
         return FavoriteAPResponse(
             ap_name=None,
             total_hours=0.0,
             has_data=False
         )
 
-    # Find favorite AP (max minutes, with most recent as tie-breaker)
-    favorite = max(
-        ap_data.items(),
-        key=lambda x: (x[1]["minutes"], x[1]["last_seen"])
-    )
-
     return FavoriteAPResponse(
-        ap_name=favorite[0],
-        total_hours=round(favorite[1]["minutes"] / 60, 1),
+        ap_name=favorite.ap_name,
+        total_hours=favorite.total_hours,
         has_data=True
     )
 
@@ -745,43 +898,37 @@ async def get_presence_pattern(
     Get presence pattern heat map data for a device.
     Returns a 24x7 matrix showing average minutes connected per hour slot.
     """
-    # Check if device exists
-    device_result = await db.execute(
-        select(TrackedDevice).where(TrackedDevice.id == device_id)
+    # Check if device exists, getting whole days since it was added. Both sides
+    # are UTC in SQLite (julianday('now') and the stored naive added_at).
+    device = await _get_device_columns(
+        db,
+        device_id,
+        cast(
+            func.julianday('now') - func.julianday(TrackedDevice.added_at), Integer
+        ).label("days_of_data"),
     )
-    device = device_result.scalar_one_or_none()
-
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
 
-    # Get all hourly presence data for this device
+    # Average minutes per hour slot, computed in SQL so at most 168 rows
+    # (24 hours x 7 days) come back; slots with no samples are left out
+    samples = func.sum(HourlyPresence.sample_count)
     result = await db.execute(
-        select(HourlyPresence).where(HourlyPresence.device_id == device_id)
+        select(
+            HourlyPresence.hour_of_day,
+            HourlyPresence.day_of_week,
+            (func.sum(HourlyPresence.total_minutes_connected) // samples).label("avg_minutes"),
+        )
+        .where(HourlyPresence.device_id == device_id)
+        .group_by(HourlyPresence.hour_of_day, HourlyPresence.day_of_week)
+        .having(samples > 0)
     )
-    presence_records = result.scalars().all()
+    slot_averages = result.all()
 
-    # Calculate days of data based on device added_at timestamp
-    now = datetime.now(timezone.utc)
-    # Ensure added_at is timezone-aware for comparison
-    added_at = device.added_at
-    if added_at.tzinfo is None:
-        added_at = added_at.replace(tzinfo=timezone.utc)
-    days_of_data = (now - added_at).days
-
-    # Build 24x7 matrix (hours as rows, days as columns)
-    # Initialize with zeros
-    data = [[0 for _ in range(7)] for _ in range(24)]
-
-    for record in presence_records:
-        hour = record.hour_of_day
-        day = record.day_of_week
-
-        # Calculate average minutes for this slot
-        if record.sample_count > 0:
-            avg_minutes = record.total_minutes_connected // record.sample_count
-        else:
-            avg_minutes = 0
+    days_of_data = device.days_of_data
 
+    # Build 24x7 matrix (hours as rows, days as columns), zero-filled, then
+    # drop each slot's average minutes into place
+    data = [[0] * 7 for _ in range(24)]
+    for hour, day, avg_minutes in slot_averages:
         data[hour][day] = avg_minutes
 
     # Require at least 7 days of data for meaningful patterns
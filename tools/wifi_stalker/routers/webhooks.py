@@ -9,7 +9,7 @@ from datetime import datetime, timezone
 from shared.database import get_db_session
 from shared.webhooks import deliver_webhook
 from shared.url_validator import validate_webhook_url
-from tools.wifi_stalker.database import WebhookConfig
+from tools.wifi_stalker.database import WebhookConfig, WEBHOOK_EVENT_FIELDS
 from tools.wifi_stalker.models import (
     WebhookCreate,
     WebhookUpdate,
@@ -58,14 +58,18 @@ async def create_webhook(
             detail=f"Invalid webhook URL: {error_msg}"
         )
 
+    # Fold the per-event flags into a single trigger bitmask
+    event_mask = 0
+    for field, bit in WEBHOOK_EVENT_FIELDS.items():
+        if getattr(webhook, field):
+            event_mask |= bit
+
     # Create new webhook
     new_webhook = WebhookConfig(
         name=webhook.name,
         webhook_type=webhook.webhook_type,
         url=webhook.url,
-        event_device_connected=webhook.event_device_connected,
-        event_device_disconnected=webhook.event_device_disconnected,
-        event_device_roamed=webhook.event_device_roamed,
+        event_mask=event_mask,
         enabled=webhook.enabled
     )
 
@@ -126,12 +130,13 @@ async def update_webhook(
         webhook.name = webhook_update.name
     if webhook_update.url is not None:
         webhook.url = webhook_update.url
-    if webhook_update.event_device_connected is not None:
-        webhook.event_device_connected = webhook_update.event_device_connected
-    if webhook_update.event_device_disconnected is not None:
-        webhook.event_device_disconnected = webhook_update.event_device_disconnected
-    if webhook_update.event_device_roamed is not None:
-        webhook.event_device_roamed = webhook_update.event_device_roamed
+    for field, bit in WEBHOOK_EVENT_FIELDS.items():
+        value = getattr(webhook_update, field)
+        if value is not None:
+            if value:
+                webhook.event_mask |= bit
+            else:
+                webhook.event_mask &= ~bit
     if webhook_update.enabled is not None:
         webhook.enabled = webhook_update.enabled
 
@@ -4,19 +4,30 @@ Background task scheduler for refreshing device status
 import asyncio
 import logging
 from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
-from sqlalchemy import select
+from sqlalchemy import Date, DateTime, Integer, case, cast, delete, func, insert, literal, select, true, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
+from shared import cache
 from shared.database import get_database
-from shared.unifi_client import UniFiClient
 from shared.config import get_settings
 from shared.websocket_manager import get_ws_manager
 from shared.webhooks import deliver_webhook
+from shared.unifi_client import UniFiClient
 from shared.unifi_session import get_shared_client, invalidate_shared_client
-from tools.wifi_stalker.database import TrackedDevice, ConnectionHistory, WebhookConfig, HourlyPresence
+from tools.wifi_stalker.database import (
+    TrackedDevice,
+    ConnectionHistory,
+    WebhookConfig,
+    HourlyPresence,
+    ApDwellDaily,
+    WEBHOOK_EVENT_BITS,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +35,29 @@ logger = logging.getLogger(__name__)
 _scheduler: AsyncIOScheduler = None
 _last_refresh: datetime = None
 
+# Device refresh loop, run as a plain asyncio task alongside the scheduler
+_refresh_task: Optional[asyncio.Task] = None
+
+# How often closed connections are folded into the daily AP dwell rollup
+DWELL_ROLLUP_INTERVAL_MINUTES = 5
+
+# Held by refreshes from picking their "now" until they commit, and by the
+# dwell rollup, so a rollup never runs while connections it should count are
+# closed but not yet committed (created on first use, see _get_history_lock())
+_history_lock: Optional[asyncio.Lock] = None
+
+# Connections closed at or before this time are in the dwell rollup
+# (None until the rollup has been rebuilt since startup)
+_dwell_rolled_through: Optional[datetime] = None
+
+# Cap on immediate refreshes for newly added devices running at once
+MAX_CONCURRENT_SINGLE_REFRESHES = 4
+
+# In-flight single-device refreshes, kept so they aren't garbage-collected
+# mid-run and can be cancelled on shutdown
+_single_refresh_tasks: Set[asyncio.Task] = set()
+_single_refresh_slots: Optional[asyncio.Semaphore] = None
+
 
 def get_scheduler() -> AsyncIOScheduler:
     """
@@ -42,6 +76,69 @@ def get_last_refresh() -> datetime:
     return _last_refresh
 
 
+def get_dwell_rolled_through() -> Optional[datetime]:
+    """
+    Get the cutoff for the daily AP dwell rollup
+
+    Wireless connections closed at or before this time are counted in
+    ApDwellDaily; anything still open or closed later is only in raw history.
+    Returns None until the rollup has been rebuilt since startup.
+    """
+    return _dwell_rolled_through
+
+
+def _get_history_lock() -> asyncio.Lock:
+    """
+    Get the lock serializing history-closing refreshes with the dwell rollup
+    """
+    global _history_lock
+    if _history_lock is None:
+        _history_lock = asyncio.Lock()
+    return _history_lock
+
+
+def _elapsed_seconds(start, end):
+    """
+    SQL expression for the seconds between two datetime expressions.
+
+    Uses SQLite's julianday(), rounded to the millisecond so float error
+    can't knock an exact second or minute down by one.
+    """
+    return func.round((func.julianday(end) - func.julianday(start)) * 86400, 3)
+
+
+def _elapsed_minutes(start, end):
+    """
+    SQL expression for the whole minutes between two datetime expressions.
+    """
+    return cast(_elapsed_seconds(start, end) / 60, Integer)
+
+
+def connected_minutes(now: datetime):
+    """
+    SQL expression for the minutes a ConnectionHistory row was connected.
+
+    Prefers the stored duration, then disconnected_at, and falls back to
+    now for connections that are still open.
+    """
+    return case(
+        (ConnectionHistory.duration_seconds != 0, ConnectionHistory.duration_seconds // 60),
+        (
+            ConnectionHistory.disconnected_at.isnot(None),
+            _elapsed_minutes(ConnectionHistory.connected_at, ConnectionHistory.disconnected_at),
+        ),
+        else_=_elapsed_minutes(ConnectionHistory.connected_at, now),
+    )
+
+
+def _closed_duration(disconnected_at: datetime):
+    """
+    SQL expression for the whole seconds a ConnectionHistory row closed at
+    disconnected_at was connected, for use in UPDATEs
+    """
+    return cast(_elapsed_seconds(ConnectionHistory.connected_at, disconnected_at), Integer)
+
+
 async def refresh_tracked_devices():
     """
     Background task that runs periodically to update device status
@@ -74,9 +171,12 @@ async def refresh_tracked_devices():
 
         # Get database session
         db_instance = get_database()
-        async for session in db_instance.get_session():
-            # Get all tracked devices
-            devices_result = await session.execute(select(TrackedDevice))
+        async with db_instance.session() as session:
+            # Get all tracked devices, with their open history entries so
+            # roaming doesn't need a query per device to close them
+            devices_result = await session.execute(
+                select(TrackedDevice).options(selectinload(TrackedDevice.open_history))
+            )
             tracked_devices = devices_result.scalars().all()
 
             if not tracked_devices:
@@ -85,25 +185,67 @@ async def refresh_tracked_devices():
 
             logger.info(f"Refreshing {len(tracked_devices)} tracked devices")
 
-            # Get all active clients from UniFi
-            active_clients = await unifi_client.get_clients()
+            # Get all active clients and blocked clients from UniFi once per
+            # cycle rather than once per device
+            active_clients, blocked_macs = await asyncio.gather(
+                unifi_client.get_clients(),
+                unifi_client.get_blocked_clients(),
+            )
             logger.info(f"Retrieved {len(active_clients)} active clients from UniFi")
 
-            # Process each tracked device
-            for device in tracked_devices:
-                await process_device(
-                    session,
-                    device,
-                    active_clients,
-                    unifi_client
-                )
+            # Share the blocked list with the device details endpoint
+            if blocked_macs is not None:
+                cache.set_blocked_clients(unifi_client.site, blocked_macs)
 
-            # Commit all changes
-            await session.commit()
+            ap_names, switch_names = await get_device_name_maps(
+                unifi_client,
+                [active_clients.get(device.mac_address) for device in tracked_devices]
+            )
+
+            # Hold the history lock from picking the timestamp until commit
+            async with _get_history_lock():
+                # One "as of" time for every change made this cycle
+                now = datetime.now(timezone.utc)
+
+                # Load enabled webhooks once for every event this cycle
+                webhooks = await get_enabled_webhooks(session)
+                triggered_webhook_ids = set()
+
+                # Look up offline durations for every reconnecting device at once
+                last_disconnects = await get_last_disconnects(session, tracked_devices, active_clients)
+                closing_history_ids = []
+                history_inserts = []
+                changed_devices = {}
+
+                # Process each tracked device
+                for device in tracked_devices:
+                    await process_device(
+                        session,
+                        device,
+                        active_clients,
+                        ap_names,
+                        switch_names,
+                        blocked_macs,
+                        webhooks,
+                        triggered_webhook_ids,
+                        last_disconnects,
+                        closing_history_ids,
+                        history_inserts,
+                        changed_devices,
+                        now
+                    )
+
+                await close_history_entries(session, closing_history_ids, now)
+                await insert_history_entries(session, history_inserts)
+                await mark_webhooks_triggered(session, triggered_webhook_ids)
+
+                # Commit all changes
+                await session.commit()
             _last_refresh = datetime.now(timezone.utc)
             logger.info("Device refresh completed successfully")
 
-            break  # Exit the async for loop after processing
+            # Send the final state of each changed device to the UI in one message
+            await broadcast_changed_devices(changed_devices)
 
     except Exception as e:
         logger.error(f"Error in refresh task: {e}", exc_info=True)
@@ -143,69 +285,224 @@ def _device_to_dict(device: TrackedDevice) -> dict:
     }
 
 
+async def broadcast_changed_devices(changed_devices: Dict[int, TrackedDevice]):
+    """
+    Broadcast the end-of-cycle state of devices that had events
+
+    A device with several events in one cycle (e.g. came online and was
+    blocked) is sent once, with its final state rather than a snapshot
+    taken partway through processing.
+
+    Args:
+        changed_devices: Devices collected by process_device(), by ID
+    """
+    if not changed_devices:
+        return
+
+    await get_ws_manager().broadcast_device_updates(
+        [_device_to_dict(device) for device in changed_devices.values()]
+    )
+
+
+async def get_enabled_webhooks(session: AsyncSession) -> List[WebhookConfig]:
+    """
+    Load all enabled webhooks, once per refresh rather than once per event
+
+    Args:
+        session: Database session
+
+    Returns:
+        List of enabled WebhookConfig rows
+    """
+    result = await session.execute(
+        select(WebhookConfig).where(WebhookConfig.enabled == True)
+    )
+    return list(result.scalars().all())
+
+
 async def trigger_webhooks(
-    session: AsyncSession,
+    webhooks: List[WebhookConfig],
     event_type: str,
     device: TrackedDevice,
     offline_duration: int = None
-):
+) -> List[int]:
     """
-    Trigger all enabled webhooks for a specific event type
+    Trigger the webhooks subscribed to a specific event type
 
     Args:
-        session: Database session
+        webhooks: Enabled webhooks from get_enabled_webhooks()
         event_type: Type of event ('connected', 'disconnected', 'roamed', 'blocked', 'unblocked')
         device: TrackedDevice that triggered the event
         offline_duration: Duration in seconds the device was offline (for connected events)
+
+    Returns:
+        IDs of the webhooks that were triggered, for mark_webhooks_triggered()
     """
-    # Get all enabled webhooks
-    result = await session.execute(
-        select(WebhookConfig).where(WebhookConfig.enabled == True)
+    event_bit = WEBHOOK_EVENT_BITS.get(event_type)
+    if event_bit is None:
+        logger.warning(f"Unknown webhook event type: {event_type}")
+        return []
+
+    matching = [webhook for webhook in webhooks if webhook.event_mask & event_bit]
+    if not matching:
+        return []
+
+    # Deliver to all subscribed webhooks concurrently, so an event costs the
+    # slowest delivery rather than the sum of them
+    results = await asyncio.gather(
+        *(
+            deliver_webhook(
+                webhook_url=webhook.url,
+                webhook_type=webhook.webhook_type,
+                event_type=event_type,
+                device_name=device.friendly_name or device.mac_address,
+                device_mac=device.mac_address,
+                ap_name=device.current_ap_name,
+                signal_strength=device.current_signal_strength,
+                offline_duration=offline_duration if event_type == 'connected' else None
+            )
+            for webhook in matching
+        ),
+        return_exceptions=True
     )
-    webhooks = result.scalars().all()
 
-    if not webhooks:
+    triggered_ids = []
+    for webhook, result in zip(matching, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error triggering webhook {webhook.name}: {result}")
+        else:
+            triggered_ids.append(webhook.id)
+
+    return triggered_ids
+
+
+async def mark_webhooks_triggered(session: AsyncSession, webhook_ids: Iterable[int]):
+    """
+    Set last_triggered on the given webhooks in a single UPDATE
+
+    Args:
+        session: Database session
+        webhook_ids: IDs returned by trigger_webhooks()
+    """
+    webhook_ids = set(webhook_ids)
+    if not webhook_ids:
         return
 
-    # Filter webhooks based on event type
-    for webhook in webhooks:
-        should_trigger = False
-
-        if event_type == 'connected' and webhook.event_device_connected:
-            should_trigger = True
-        elif event_type == 'disconnected' and webhook.event_device_disconnected:
-            should_trigger = True
-        elif event_type == 'roamed' and webhook.event_device_roamed:
-            should_trigger = True
-        elif event_type == 'blocked' and webhook.event_device_blocked:
-            should_trigger = True
-        elif event_type == 'unblocked' and webhook.event_device_unblocked:
-            should_trigger = True
-
-        if should_trigger:
-            # Trigger webhook asynchronously (don't wait for response)
-            try:
-                await deliver_webhook(
-                    webhook_url=webhook.url,
-                    webhook_type=webhook.webhook_type,
-                    event_type=event_type,
-                    device_name=device.friendly_name or device.mac_address,
-                    device_mac=device.mac_address,
-                    ap_name=device.current_ap_name,
-                    signal_strength=device.current_signal_strength,
-                    offline_duration=offline_duration if event_type == 'connected' else None
-                )
-                # Update last_triggered timestamp
-                webhook.last_triggered = datetime.now(timezone.utc)
-            except Exception as e:
-                logger.error(f"Error triggering webhook {webhook.name}: {e}")
+    await session.execute(
+        update(WebhookConfig)
+        .where(WebhookConfig.id.in_(webhook_ids))
+        .values(last_triggered=datetime.now(timezone.utc))
+    )
+
+
+async def get_last_disconnects(
+    session: AsyncSession,
+    devices: Iterable[TrackedDevice],
+    active_clients: dict
+) -> Dict[int, datetime]:
+    """
+    Load when each reconnecting device last disconnected, in a single query
+
+    Only devices marked offline that now appear in active_clients are looked
+    up, since the offline duration is only reported when a device comes back.
+
+    Args:
+        session: Database session
+        devices: Tracked devices about to be processed
+        active_clients: Dictionary of active clients from UniFi
+
+    Returns:
+        Latest disconnected_at by device ID (devices never disconnected are absent)
+    """
+    device_ids = [
+        device.id for device in devices
+        if not device.is_connected and device.mac_address in active_clients
+    ]
+    if not device_ids:
+        return {}
+
+    result = await session.execute(
+        select(ConnectionHistory.device_id, func.max(ConnectionHistory.disconnected_at))
+        .where(
+            ConnectionHistory.device_id.in_(device_ids),
+            ConnectionHistory.disconnected_at.isnot(None)
+        )
+        .group_by(ConnectionHistory.device_id)
+    )
+    return dict(result.all())
+
+
+async def get_device_name_maps(
+    unifi_client: UniFiClient,
+    clients: Iterable[Optional[dict]]
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Get AP and switch names by MAC, reusing the cached maps when possible
+
+    The cached maps are only used if they name every AP and switch the given
+    clients are connected to; otherwise (e.g. a newly adopted AP) they're
+    fetched again, so history isn't recorded under a bare MAC. If that fetch
+    fails, the cached maps (or empty ones) are used for this cycle.
+
+    Args:
+        unifi_client: Connected UniFi client
+        clients: Active clients of the tracked devices (None for offline ones)
+
+    Returns:
+        (ap_names, switch_names) as from UniFiClient.get_device_name_maps()
+    """
+    cached = cache.get_device_names(unifi_client.site)
+    if cached is not None:
+        ap_names, switch_names = cached
+        if all(
+            _uplink_named(client, 'ap_mac', ap_names) and _uplink_named(client, 'sw_mac', switch_names)
+            for client in clients
+            if client
+        ):
+            return ap_names, switch_names
+
+    name_maps = await unifi_client.get_device_name_maps()
+    if name_maps is None:
+        return cached if cached is not None else ({}, {})
+
+    ap_names, switch_names = name_maps
+    cache.set_device_names(unifi_client.site, ap_names, switch_names)
+    return ap_names, switch_names
+
+
+def _uplink_named(client, key: str, names: dict) -> bool:
+    """
+    Check that a client's AP/switch MAC (if it has one) is in a name map
+    """
+    if isinstance(client, dict):
+        mac = client.get(key)
+    else:
+        mac = getattr(client, key, None)
+    return not mac or mac.lower() in names
+
+
+def _device_name(names: dict, mac: str) -> str:
+    """
+    Look up an AP/switch name by MAC, falling back to the MAC itself
+    """
+    normalized_mac = mac.lower()
+    return names.get(normalized_mac, normalized_mac)
 
 
 async def process_device(
     session: AsyncSession,
     device: TrackedDevice,
     active_clients: dict,
-    unifi_client: UniFiClient
+    ap_names: dict,
+    switch_names: dict,
+    blocked_macs: Optional[Set[str]],
+    webhooks: List[WebhookConfig],
+    triggered_webhook_ids: Set[int],
+    last_disconnects: Dict[int, datetime],
+    closing_history_ids: List[int],
+    history_inserts: List[dict],
+    changed_devices: Dict[int, TrackedDevice],
+    now: datetime
 ):
     """
     Process a single tracked device (wireless or wired)
@@ -214,13 +511,19 @@ async def process_device(
         session: Database session
         device: TrackedDevice to process
         active_clients: Dictionary of active clients from UniFi
-        unifi_client: UniFi client instance
+        ap_names: AP names by MAC/BSSID from UniFiClient.get_device_name_maps()
+        switch_names: Switch names by MAC from UniFiClient.get_device_name_maps()
+        blocked_macs: Blocked client MACs, or None if they couldn't be fetched
+        webhooks: Enabled webhooks from get_enabled_webhooks()
+        triggered_webhook_ids: Collects the IDs of webhooks triggered by this device
+        last_disconnects: Last disconnect time by device ID from get_last_disconnects()
+        closing_history_ids: Collects history entries to close, for close_history_entries()
+        history_inserts: Collects new history entries, for insert_history_entries()
+        changed_devices: Collects devices with events this cycle, broadcast after commit
+        now: Timestamp for every change made this cycle
     """
-    # Normalize MAC address for lookup
-    mac = device.mac_address.lower()
-
-    # Get WebSocket manager for broadcasting updates
-    ws_manager = get_ws_manager()
+    # Stored MACs are already lowercase, matching the active_clients keys
+    mac = device.mac_address
 
     # Check if device is in active clients
     client = active_clients.get(mac)
@@ -230,7 +533,7 @@ async def process_device(
         logger.debug(f"Device {device.mac_address} is online")
 
         # Update last_seen
-        device.last_seen = datetime.now(timezone.utc)
+        device.last_seen = now
 
         # Get client data (handle both dict and object formats)
         if isinstance(client, dict):
@@ -266,7 +569,7 @@ async def process_device(
 
             if sw_mac:
                 # Get switch name
-                switch_name = await unifi_client.get_switch_name_by_mac(sw_mac)
+                switch_name = _device_name(switch_names, sw_mac)
 
                 # Check if switch or port changed
                 if device.current_switch_mac != sw_mac or device.current_switch_port != sw_port:
@@ -279,18 +582,17 @@ async def process_device(
 
                     # Close previous history entry if exists
                     if device.is_connected and device.current_switch_mac:
-                        await close_connection_history(session, device)
+                        close_connection_history(device, closing_history_ids)
 
                     # Create new history entry for wired device
-                    new_history = ConnectionHistory(
+                    history_inserts.append(dict(
                         device_id=device.id,
-                        connected_at=datetime.now(timezone.utc),
+                        connected_at=now,
                         is_wired=True,
                         switch_mac=sw_mac,
                         switch_name=switch_name,
                         switch_port=sw_port
-                    )
-                    session.add(new_history)
+                    ))
 
                     # Update device current switch info
                     device.current_switch_mac = sw_mac
@@ -301,11 +603,11 @@ async def process_device(
                     device.current_ap_mac = None
                     device.current_ap_name = None
 
-                    # Broadcast update via WebSocket
-                    await ws_manager.broadcast_device_update(_device_to_dict(device))
+                    # Include in the WebSocket broadcast
+                    changed_devices[device.id] = device
 
                     # Trigger roaming webhooks (port changes are like roaming)
-                    await trigger_webhooks(session, 'roamed', device)
+                    triggered_webhook_ids.update(await trigger_webhooks(webhooks, 'roamed', device))
 
         else:
             # Wireless device - track AP
@@ -320,7 +622,7 @@ async def process_device(
 
             if ap_mac:
                 # Get AP name
-                ap_name = await unifi_client.get_ap_name_by_mac(ap_mac)
+                ap_name = _device_name(ap_names, ap_mac)
 
                 # Determine if this is a new connection or roaming event
                 was_offline = not device.is_connected
@@ -331,45 +633,38 @@ async def process_device(
                     logger.info(f"Device {device.mac_address} came online on AP {ap_name}")
 
                     # Create new history entry for this connection
-                    new_history = ConnectionHistory(
+                    history_inserts.append(dict(
                         device_id=device.id,
                         ap_mac=ap_mac,
                         ap_name=ap_name,
                         ssid=essid,
-                        connected_at=datetime.now(timezone.utc),
+                        connected_at=now,
                         signal_strength=signal_strength,
                         is_wired=False
-                    )
-                    session.add(new_history)
+                    ))
 
                     # Update device current AP
                     device.current_ap_mac = ap_mac
                     device.current_ap_name = ap_name
                     device.is_connected = True
 
-                    # Broadcast connection event via WebSocket
-                    await ws_manager.broadcast_device_update(_device_to_dict(device))
+                    # Include connection event in the WebSocket broadcast
+                    changed_devices[device.id] = device
 
                     # Calculate offline duration for webhook
                     offline_duration = None
-                    history_result = await session.execute(
-                        select(ConnectionHistory)
-                        .where(ConnectionHistory.device_id == device.id)
-                        .where(ConnectionHistory.disconnected_at.isnot(None))
-                        .order_by(ConnectionHistory.disconnected_at.desc())
-                    )
-                    last_disconnect = history_result.scalars().first()
+                    disconnected_at = last_disconnects.get(device.id)
 
-                    if last_disconnect and last_disconnect.disconnected_at:
-                        disconnected_at = last_disconnect.disconnected_at
+                    if disconnected_at:
                         if disconnected_at.tzinfo is None:
                             disconnected_at = disconnected_at.replace(tzinfo=timezone.utc)
-                        now = datetime.now(timezone.utc)
                         offline_duration = int((now - disconnected_at).total_seconds())
                         logger.debug(f"Device {device.mac_address} was offline for {offline_duration} seconds")
 
                     # Trigger connection webhooks with offline duration
-                    await trigger_webhooks(session, 'connected', device, offline_duration=offline_duration)
+                    triggered_webhook_ids.update(await trigger_webhooks(
+                        webhooks, 'connected', device, offline_duration=offline_duration
+                    ))
 
                 elif ap_changed:
                     # Device roamed to a different AP
@@ -380,29 +675,28 @@ async def process_device(
 
                     # Close previous history entry
                     if device.current_ap_mac:
-                        await close_connection_history(session, device)
+                        close_connection_history(device, closing_history_ids)
 
                     # Create new history entry for new AP
-                    new_history = ConnectionHistory(
+                    history_inserts.append(dict(
                         device_id=device.id,
                         ap_mac=ap_mac,
                         ap_name=ap_name,
                         ssid=essid,
-                        connected_at=datetime.now(timezone.utc),
+                        connected_at=now,
                         signal_strength=signal_strength,
                         is_wired=False
-                    )
-                    session.add(new_history)
+                    ))
 
                     # Update device current AP
                     device.current_ap_mac = ap_mac
                     device.current_ap_name = ap_name
 
-                    # Broadcast roaming event via WebSocket
-                    await ws_manager.broadcast_device_update(_device_to_dict(device))
+                    # Include roaming event in the WebSocket broadcast
+                    changed_devices[device.id] = device
 
                     # Trigger roaming webhooks
-                    await trigger_webhooks(session, 'roamed', device)
+                    triggered_webhook_ids.update(await trigger_webhooks(webhooks, 'roamed', device))
 
         # Ensure device is marked as connected
         device.is_connected = True
@@ -412,74 +706,98 @@ async def process_device(
         if device.is_connected:
             logger.info(f"Device {device.mac_address} went offline")
 
-            # Close any open history entries
-            await close_connection_history(session, device)
+            # Close any open history entries (batched by the caller)
+            close_connection_history(device, closing_history_ids)
 
             # Mark device as disconnected
             device.is_connected = False
 
-            # Broadcast disconnection event via WebSocket
-            await ws_manager.broadcast_device_update(_device_to_dict(device))
+            # Include disconnection event in the WebSocket broadcast
+            changed_devices[device.id] = device
 
             # Trigger disconnection webhooks
-            await trigger_webhooks(session, 'disconnected', device)
+            triggered_webhook_ids.update(await trigger_webhooks(webhooks, 'disconnected', device))
 
-    # Always check blocked status (works for both online and offline devices)
-    try:
-        is_blocked = await unifi_client.is_client_blocked(mac)
+    # Always check blocked status (works for both online and offline devices),
+    # unless the blocked list couldn't be fetched this cycle
+    if blocked_macs is not None:
+        is_blocked = mac in blocked_macs
         if device.is_blocked != is_blocked:
             logger.info(f"Device {device.mac_address} blocked status changed to {is_blocked}")
             device.is_blocked = is_blocked
-            # Broadcast update via WebSocket
-            await ws_manager.broadcast_device_update(_device_to_dict(device))
+            # Include in the WebSocket broadcast
+            changed_devices[device.id] = device
             # Trigger blocked/unblocked webhooks
             event_type = 'blocked' if is_blocked else 'unblocked'
-            await trigger_webhooks(session, event_type, device)
-    except Exception as e:
-        logger.debug(f"Could not check blocked status for {device.mac_address}: {e}")
+            triggered_webhook_ids.update(await trigger_webhooks(webhooks, event_type, device))
 
 
-async def close_connection_history(session: AsyncSession, device: TrackedDevice):
+def close_connection_history(device: TrackedDevice, closing_history_ids: List[int]):
     """
-    Close the most recent open connection history entry for a device
+    Queue the open connection history entries of a device for closing
+
+    Uses device.open_history, so the device must have been loaded with
+    selectinload(TrackedDevice.open_history). The entries are closed by
+    close_history_entries() at the end of the refresh.
 
     Args:
-        session: Database session
         device: TrackedDevice
+        closing_history_ids: Collects the IDs of the entries to close
     """
-    # Find the most recent open history entry
-    result = await session.execute(
-        select(ConnectionHistory)
-        .where(ConnectionHistory.device_id == device.id)
-        .where(ConnectionHistory.disconnected_at.is_(None))
-        .order_by(ConnectionHistory.connected_at.desc())
-    )
-    open_history = result.scalars().first()
+    closing_history_ids.extend(open_history.id for open_history in device.open_history)
 
-    if open_history:
-        # Close the history entry
-        open_history.disconnected_at = datetime.now(timezone.utc)
+    logger.debug(
+        f"Closing {len(device.open_history)} history entries for device {device.mac_address}"
+    )
 
-        # Calculate duration in seconds
-        # Handle both naive and timezone-aware datetimes
-        connected_at = open_history.connected_at
-        disconnected_at = open_history.disconnected_at
 
-        # If connected_at is naive, make it aware (assume UTC)
-        if connected_at.tzinfo is None:
-            connected_at = connected_at.replace(tzinfo=timezone.utc)
+async def close_history_entries(session: AsyncSession, history_ids: List[int], now: datetime):
+    """
+    Close the given open connection history entries
 
-        # If disconnected_at is naive, make it aware (assume UTC)
-        if disconnected_at.tzinfo is None:
-            disconnected_at = disconnected_at.replace(tzinfo=timezone.utc)
+    Used for every device that roamed or went offline during a refresh: one
+    UPDATE for the whole batch, with the duration computed in SQL.
 
-        duration = (disconnected_at - connected_at).total_seconds()
-        open_history.duration_seconds = int(duration)
+    Args:
+        session: Database session
+        history_ids: IDs of the history entries to close
+        now: Disconnect time to record
+    """
+    if not history_ids:
+        return
 
-        logger.debug(
-            f"Closed history entry for device {device.mac_address}, "
-            f"duration: {duration} seconds"
+    await session.execute(
+        update(ConnectionHistory)
+        .where(
+            ConnectionHistory.id.in_(history_ids),
+            ConnectionHistory.disconnected_at.is_(None)
+        )
+        .values(
+            disconnected_at=now,
+            duration_seconds=_closed_duration(now)
         )
+        # The loaded entries aren't read again before the commit expires them
+        .execution_options(synchronize_session=False)
+    )
+    logger.debug(f"Closed {len(history_ids)} history entries")
+
+
+async def insert_history_entries(session: AsyncSession, rows: List[dict]):
+    """
+    Insert the connection history entries opened during a refresh
+
+    One bulk INSERT for the whole batch; nothing reads the new entries back
+    during the refresh, so no primary keys are fetched.
+
+    Args:
+        session: Database session
+        rows: ConnectionHistory column values, one dict per entry
+    """
+    if not rows:
+        return
+
+    await session.execute(insert(ConnectionHistory), rows)
+    logger.debug(f"Opened {len(rows)} history entries")
 
 
 async def refresh_single_device(device_id: int):
@@ -500,10 +818,12 @@ async def refresh_single_device(device_id: int):
 
         # Get database session
         db_instance = get_database()
-        async for session in db_instance.get_session():
+        async with db_instance.session() as session:
             # Get the specific device
             device_result = await session.execute(
-                select(TrackedDevice).where(TrackedDevice.id == device_id)
+                select(TrackedDevice)
+                .where(TrackedDevice.id == device_id)
+                .options(selectinload(TrackedDevice.open_history))
             )
             device = device_result.scalar_one_or_none()
 
@@ -511,22 +831,47 @@ async def refresh_single_device(device_id: int):
                 logger.warning(f"Device ID {device_id} not found")
                 return
 
-            # Get all active clients from UniFi
-            active_clients = await unifi_client.get_clients()
-
-            # Process this specific device
-            await process_device(
-                session,
-                device,
-                active_clients,
-                unifi_client
+            # Get all active clients, blocked clients and AP/switch names from UniFi
+            active_clients, blocked_macs = await asyncio.gather(
+                unifi_client.get_clients(),
+                unifi_client.get_blocked_clients(),
+            )
+            ap_names, switch_names = await get_device_name_maps(
+                unifi_client, [active_clients.get(device.mac_address)]
             )
 
-            # Commit changes
-            await session.commit()
+            # Hold the history lock from picking the timestamp until commit
+            async with _get_history_lock():
+                # Process this specific device
+                now = datetime.now(timezone.utc)
+                triggered_webhook_ids = set()
+                closing_history_ids = []
+                history_inserts = []
+                changed_devices = {}
+                await process_device(
+                    session,
+                    device,
+                    active_clients,
+                    ap_names,
+                    switch_names,
+                    blocked_macs,
+                    await get_enabled_webhooks(session),
+                    triggered_webhook_ids,
+                    await get_last_disconnects(session, [device], active_clients),
+                    closing_history_ids,
+                    history_inserts,
+                    changed_devices,
+                    now
+                )
+                await close_history_entries(session, closing_history_ids, now)
+                await insert_history_entries(session, history_inserts)
+                await mark_webhooks_triggered(session, triggered_webhook_ids)
+
+                # Commit changes
+                await session.commit()
             logger.info(f"Single device refresh completed for ID: {device_id}")
 
-            break  # Exit the async for loop after processing
+            await broadcast_changed_devices(changed_devices)
 
     except Exception as e:
         logger.error(f"Error refreshing single device: {e}", exc_info=True)
@@ -534,6 +879,74 @@ async def refresh_single_device(device_id: int):
         await invalidate_shared_client()
 
 
+async def _run_bounded_single_refresh(device_id: int):
+    """
+    Run refresh_single_device() once a concurrency slot is free
+    """
+    async with _single_refresh_slots:
+        await refresh_single_device(device_id)
+
+
+def schedule_single_device_refresh(device_id: int):
+    """
+    Refresh a single device in the background without waiting for the result
+
+    At most MAX_CONCURRENT_SINGLE_REFRESHES run at once; the rest wait for a
+    free slot, so a burst of newly added devices can't pile up UniFi calls.
+
+    Args:
+        device_id: ID of the device to refresh
+    """
+    global _single_refresh_slots
+    if _single_refresh_slots is None:
+        _single_refresh_slots = asyncio.Semaphore(MAX_CONCURRENT_SINGLE_REFRESHES)
+
+    task = asyncio.create_task(_run_bounded_single_refresh(device_id))
+    _single_refresh_tasks.add(task)
+    task.add_done_callback(_single_refresh_tasks.discard)
+
+
+async def _cancel_single_refreshes():
+    """
+    Cancel any single-device refreshes that are still queued or running
+    """
+    global _single_refresh_slots
+    tasks = list(_single_refresh_tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    _single_refresh_slots = None
+
+
+async def _refresh_loop(interval: float):
+    """
+    Run refresh_tracked_devices() every interval seconds until cancelled
+
+    Ticks are scheduled from the event loop clock rather than from when the
+    previous refresh finished, so refresh time doesn't add drift. Runs never
+    overlap; a refresh that overruns skips the ticks it missed.
+
+    Args:
+        interval: Seconds between refreshes
+    """
+    loop = asyncio.get_running_loop()
+    next_run = loop.time() + interval
+
+    while True:
+        await asyncio.sleep(max(0.0, next_run - loop.time()))
+
+        try:
+            await refresh_tracked_devices()
+        except Exception as e:
+            logger.error(f"Unexpected error in refresh loop: {e}", exc_info=True)
+
+        next_run += interval
+        now = loop.time()
+        if next_run < now:
+            next_run += ((now - next_run) // interval + 1) * interval
+
+
 async def start_scheduler():
     """
     Start the background scheduler
@@ -541,17 +954,6 @@ async def start_scheduler():
     settings = get_settings()
     scheduler = get_scheduler()
 
-    # Add the refresh job - use stalker_refresh_interval from settings
-    scheduler.add_job(
-        refresh_tracked_devices,
-        trigger=IntervalTrigger(seconds=settings.stalker_refresh_interval),
-        id="refresh_tracked_devices",
-        name="Refresh tracked device status",
-        replace_existing=True,
-        misfire_grace_time=None,  # Allow job to run even if late
-        max_instances=1  # Prevent overlapping runs
-    )
-
     # Add hourly presence aggregation job for analytics
     scheduler.add_job(
         aggregate_hourly_presence,
@@ -563,6 +965,17 @@ async def start_scheduler():
         max_instances=1
     )
 
+    # Add dwell rollup job for the dwell-time / favorite-AP analytics
+    scheduler.add_job(
+        rollup_ap_dwell_time,
+        trigger=IntervalTrigger(minutes=DWELL_ROLLUP_INTERVAL_MINUTES),
+        id="rollup_ap_dwell_time",
+        name="Roll up daily AP dwell time",
+        replace_existing=True,
+        misfire_grace_time=None,
+        max_instances=1
+    )
+
     # Start the scheduler
     scheduler.start()
     logger.info(
@@ -572,6 +985,11 @@ async def start_scheduler():
     # Run tasks immediately on startup
     await refresh_tracked_devices()
     await aggregate_hourly_presence()
+    await rollup_ap_dwell_time()
+
+    # Then keep refreshing every stalker_refresh_interval seconds
+    global _refresh_task
+    _refresh_task = asyncio.create_task(_refresh_loop(settings.stalker_refresh_interval))
 
 
 async def stop_scheduler():
@@ -583,6 +1001,17 @@ async def stop_scheduler():
         scheduler.shutdown()
         logger.info("Scheduler stopped")
 
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        await asyncio.gather(_refresh_task, return_exceptions=True)
+        _refresh_task = None
+
+    await _cancel_single_refreshes()
+
+    global _history_lock
+    _history_lock = None
+
 
 async def aggregate_hourly_presence():
     """
@@ -600,53 +1029,125 @@ async def aggregate_hourly_presence():
         logger.info(f"Running hourly presence aggregation (day={day_of_week}, hour={hour_of_day})")
 
         db_instance = get_database()
-        async for session in db_instance.get_session():
-            # Get all tracked wireless devices that are currently connected
+        async with db_instance.session() as session:
+            # Add an hour to this slot for every connected wireless device in a
+            # single upsert, creating the slot rows that don't exist yet
+            connected_devices = select(
+                TrackedDevice.id,
+                literal(day_of_week),
+                literal(hour_of_day),
+                literal(60),
+                literal(1),
+                literal(now, DateTime)
+            ).where(
+                TrackedDevice.is_connected == True,
+                TrackedDevice.is_wired == False
+            )
+            upsert = sqlite_insert(HourlyPresence).from_select(
+                [
+                    HourlyPresence.device_id,
+                    HourlyPresence.day_of_week,
+                    HourlyPresence.hour_of_day,
+                    HourlyPresence.total_minutes_connected,
+                    HourlyPresence.sample_count,
+                    HourlyPresence.last_updated,
+                ],
+                connected_devices
+            )
             result = await session.execute(
-                select(TrackedDevice).where(
-                    TrackedDevice.is_connected == True,
-                    TrackedDevice.is_wired == False
+                upsert.on_conflict_do_update(
+                    index_elements=[
+                        HourlyPresence.device_id,
+                        HourlyPresence.day_of_week,
+                        HourlyPresence.hour_of_day,
+                    ],
+                    set_={
+                        'total_minutes_connected': HourlyPresence.total_minutes_connected + 60,
+                        'sample_count': HourlyPresence.sample_count + 1,
+                        'last_updated': upsert.excluded.last_updated,
+                    }
                 )
             )
-            connected_devices = result.scalars().all()
 
-            if not connected_devices:
+            if not result.rowcount:
                 logger.debug("No connected wireless devices to aggregate")
                 return
 
-            logger.info(f"Aggregating presence for {len(connected_devices)} connected devices")
+            logger.info(f"Aggregated presence for {result.rowcount} connected devices")
+
+            await session.commit()
+            logger.info("Hourly presence aggregation completed")
 
-            for device in connected_devices:
-                # Find or create the hourly presence record for this slot
-                presence_result = await session.execute(
-                    select(HourlyPresence).where(
-                        HourlyPresence.device_id == device.id,
-                        HourlyPresence.day_of_week == day_of_week,
-                        HourlyPresence.hour_of_day == hour_of_day
+    except Exception as e:
+        logger.error(f"Error in hourly presence aggregation: {e}", exc_info=True)
+
+
+async def rollup_ap_dwell_time():
+    """
+    Periodic task to fold closed wireless connections into ApDwellDaily.
+
+    The first run after startup rebuilds the whole rollup. After that only
+    the days with connections that closed since the previous run are
+    recomputed, since closing is the only way a history row changes.
+    """
+    global _dwell_rolled_through
+
+    try:
+        day = func.date(ConnectionHistory.connected_at, type_=Date)
+        wireless = (
+            ConnectionHistory.is_wired == False,
+            ConnectionHistory.ap_name.isnot(None),
+        )
+
+        db_instance = get_database()
+        # No refresh can be part-way through closing connections while the
+        # lock is held, so everything closed by the cutoff is committed
+        async with _get_history_lock(), db_instance.session() as session:
+            previous = _dwell_rolled_through
+            rolled_through = datetime.now(timezone.utc)
+
+            if previous is None:
+                logger.info("Rebuilding daily AP dwell rollup")
+                await session.execute(delete(ApDwellDaily))
+                day_filter = true()
+            else:
+                # Days whose totals changed: connections closed since the last run
+                days_result = await session.execute(
+                    select(day).distinct().where(
+                        *wireless,
+                        ConnectionHistory.disconnected_at > previous,
+                        ConnectionHistory.disconnected_at <= rolled_through
                     )
                 )
-                presence = presence_result.scalar_one_or_none()
-
-                if presence:
-                    # Update existing record
-                    presence.total_minutes_connected += 60  # Add one hour
-                    presence.sample_count += 1
-                    presence.last_updated = now
-                else:
-                    # Create new record
-                    presence = HourlyPresence(
-                        device_id=device.id,
-                        day_of_week=day_of_week,
-                        hour_of_day=hour_of_day,
-                        total_minutes_connected=60,
-                        sample_count=1,
-                        last_updated=now
-                    )
-                    session.add(presence)
+                days = days_result.scalars().all()
+                if not days:
+                    _dwell_rolled_through = rolled_through
+                    return
+
+                await session.execute(delete(ApDwellDaily).where(ApDwellDaily.day.in_(days)))
+                day_filter = day.in_(days)
+
+            # Recompute those days from every connection closed by the cutoff
+            await session.execute(
+                insert(ApDwellDaily).from_select(
+                    ["device_id", "ap_name", "day", "minutes", "last_connected_at"],
+                    select(
+                        ConnectionHistory.device_id,
+                        ConnectionHistory.ap_name,
+                        day,
+                        func.sum(connected_minutes(rolled_through)),
+                        func.max(ConnectionHistory.connected_at),
+                    ).where(
+                        *wireless,
+                        ConnectionHistory.disconnected_at <= rolled_through,
+                        day_filter
+                    ).group_by(ConnectionHistory.device_id, ConnectionHistory.ap_name, day)
+                )
+            )
 
             await session.commit()
-            logger.info("Hourly presence aggregation completed")
-            break  # Exit the async for loop
+            _dwell_rolled_through = rolled_through
+            logger.debug(f"Daily AP dwell rollup updated through {rolled_through.isoformat()}")
 
     except Exception as e:
-        logger.error(f"Error in hourly presence aggregation: {e}", exc_info=True)
+        logger.error(f"Error in daily AP dwell rollup: {e}", exc_info=True)
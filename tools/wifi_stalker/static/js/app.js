@@ -124,6 +124,8 @@ function dashboard() {
 
                 if (data.type === 'device_update') {
                     this.handleDeviceUpdate(data.device);
+                } else if (data.type === 'device_updates') {
+                    data.devices.forEach(device => this.handleDeviceUpdate(device));
                 } else if (data.type === 'status_update') {
                     this.handleStatusUpdate(data.status);
                 } else if (data.type === 'pong') {